@@ -0,0 +1,315 @@
+import os
+import time
+import queue
+import threading
+import hashlib
+import functools
+import numpy as np
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from ObjLoader import ObjLoader
+from VertexFormat import VertexFormat
+
+
+# loads meshes and textures on worker threads and uploads them on the render thread, every load returns a
+# future that resolves once the asset is on the GPU, call process_uploads once per frame with the context current,
+# with a watch_interval the loaded files are also watched and edits are reloaded into the same GL objects,
+# with a memory_budget mesh loads wait until the ObjLoader.scan estimate of their memory fits next to the meshes
+# being decoded or waiting for their upload, a mesh that could never fit is refused with a MemoryError
+class AssetManager:
+    def __init__(self, max_workers=None, frame_budget=0.004, chunk_size=1 << 20, watch_interval=None,
+                 block_size=1 << 16, memory_budget=None):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.frame_budget = frame_budget # seconds of GL uploads per process_uploads call
+        self.chunk_size = chunk_size # bytes per glBufferSubData or glTexSubImage2D call
+        self.uploads = queue.Queue() # (future, upload steps) of the assets decoded by the workers
+        self.current = None # the upload process_uploads is in the middle of
+        self.watch_interval = watch_interval # seconds between the file checks of reload_changed, None turns it off
+        self.block_size = block_size # bytes per digest, a reload uploads only the blocks whose digest changed
+        self.watched = [] # {'kind', 'file', 'options', 'stat', 'asset', 'generation', 'sizes', 'digests'}
+        self.next_check = 0.0
+        self.memory_budget = memory_budget # bytes, None loads without checking
+        self.reserved = 0 # estimated bytes of the meshes in flight
+        self.budget = threading.Condition() # guards reserved, workers wait on it for room in the budget
+
+    def submit(self, decode):
+        # runs decode on a worker, it returns the generator of GL upload steps that is queued for the render thread
+        ready = Future()
+
+        def work():
+            if not ready.set_running_or_notify_cancel():
+                return
+            try:
+                steps = decode()
+            except Exception as e:
+                ready.set_exception(e)
+            else:
+                self.uploads.put((ready, steps))
+
+        self.executor.submit(work)
+        return ready
+
+    def watch(self, kind, file, options):
+        # starts watching a file before it is decoded, so edits made during the first load are noticed too
+        entry = {'kind': kind, 'file': file, 'options': options, 'stat': None, 'asset': None, 'generation': 0,
+                 'sizes': None, 'digests': None}
+        if self.watch_interval is not None:
+            try:
+                entry['stat'] = AssetManager.signature(file)
+            except OSError:
+                pass # the load itself reports the missing file through its future
+            self.watched.append(entry)
+        return entry
+
+    def load_mesh(self, file, scale=1.0, compact=True):
+        # the future resolves to {'VAO', 'VBO', 'EBO', 'index_count', 'index_type', 'decode'}, decode is the
+        # VertexFormat position decode matrix for compact meshes and the identity otherwise, a reload updates
+        # the same dict
+        entry = self.watch('mesh', file, (scale, compact))
+
+        def decode():
+            indices, vertices, decode, reserved = self.decode_within_budget(file, scale, compact)
+            if self.watch_interval is not None:
+                entry['sizes'] = [vertices.nbytes, indices.nbytes]
+                entry['digests'] = [self.block_digests(data, self.block_size) for data in (vertices, indices)]
+            return self.release_after(AssetManager.upload_mesh(indices, vertices, decode, self.chunk_size), reserved)
+        entry['asset'] = self.submit(decode)
+        return entry['asset']
+
+    def load_texture(self, file):
+        # the future resolves to the texture name, a reload keeps the name
+        entry = self.watch('texture', file, ())
+
+        def decode():
+            from TextureLoader import decode_texture
+            width, height, img_data = decode_texture(file)
+            if self.watch_interval is not None:
+                entry['sizes'] = (width, height)
+                entry['digests'] = self.block_digests(img_data, self.row_block(width))
+            return AssetManager.upload_texture(width, height, img_data, self.chunk_size)
+        entry['asset'] = self.submit(decode)
+        return entry['asset']
+
+    def decode_within_budget(self, file, scale, compact):
+        # decode_mesh once the mesh fits into the memory budget, returns (indices, vertices, decode, reserved),
+        # the parse tables are given back right away, the reserved bytes of the result once it is uploaded, both
+        # are reserved at the upper bounds of scan so a mesh that welds worse than usual still fits the budget
+        parse, result = 0, 0
+        if self.memory_budget is not None:
+            estimates = ObjLoader.scan(file)['estimates']
+            parse, result = estimates['parse'], estimates['compact' if compact else 'indexed']
+            if parse + result > self.memory_budget:
+                raise MemoryError('%s needs about %.1f MB, the memory budget is %.1f MB' %
+                                  (file, (parse + result) / 1e6, self.memory_budget / 1e6))
+            with self.budget:
+                self.budget.wait_for(lambda: self.reserved + parse + result <= self.memory_budget)
+                self.reserved += parse + result
+        try:
+            indices, vertices, decode = AssetManager.decode_mesh(file, scale, compact)
+        except BaseException:
+            self.release(parse + result)
+            raise
+        self.release(parse)
+        return indices, vertices, decode, result
+
+    def release(self, size):
+        if size:
+            with self.budget:
+                self.reserved -= size
+                self.budget.notify_all()
+
+    def release_after(self, steps, size):
+        # passes the upload steps through and gives size back to the memory budget when they are done
+        try:
+            return (yield from steps)
+        finally:
+            self.release(size)
+
+    @staticmethod
+    def decode_mesh(file, scale, compact):
+        # (indices, vertices, decode) of load_mesh
+        if compact:
+            return ObjLoader.load_compact(file, scale)
+        indices, vertices, _ = ObjLoader.load_model(file, False, scale, optimize=True, structured=True)
+        return indices, vertices, np.eye(4, dtype=np.float32)
+
+    @staticmethod
+    def signature(file):
+        # what reload_changed compares to notice an edit
+        stat = os.stat(file)
+        return stat.st_mtime_ns, stat.st_size
+
+    @staticmethod
+    def block_digests(data, block_size):
+        # one short hash per block_size bytes of data
+        raw = memoryview(np.ascontiguousarray(data)).cast('B') if isinstance(data, np.ndarray) else memoryview(data)
+        return [hashlib.blake2b(raw[start:start + block_size], digest_size=8).digest()
+                for start in range(0, raw.nbytes, block_size)]
+
+    @staticmethod
+    def changed_ranges(old, new, block_size, nbytes, chunk_size):
+        # [start, stop) byte ranges of the blocks whose digest is not in old at the same place, neighbouring
+        # blocks are merged up to chunk_size bytes
+        ranges = []
+        for block, digest in enumerate(new):
+            if block < len(old) and old[block] == digest:
+                continue
+            start, stop = block * block_size, min((block + 1) * block_size, nbytes)
+            if ranges and ranges[-1][1] == start and stop - ranges[-1][0] <= chunk_size:
+                ranges[-1][1] = stop
+            else:
+                ranges.append([start, stop])
+        return ranges
+
+    def row_block(self, width):
+        # texture digests cover whole RGBA rows so a changed block is a band for glTexSubImage2D
+        return max(self.block_size // (width * 4), 1) * width * 4
+
+    def reload_changed(self):
+        # checks the watched files every watch_interval seconds and reloads the edited ones, only the changed
+        # asset is decoded again and only its changed blocks are uploaded, through the same frame budgeted queue
+        # as the loads, returns [(file, future)] of the reloads it started, call once per frame
+        now = time.perf_counter()
+        if self.watch_interval is None or now < self.next_check:
+            return []
+        self.next_check = now + self.watch_interval
+        reloads = []
+        for entry in self.watched:
+            asset = entry['asset']
+            if not asset.done() or asset.cancelled() or asset.exception() is not None:
+                continue # nothing on the GPU to update yet
+            try:
+                stat = AssetManager.signature(entry['file'])
+            except OSError:
+                continue # editors that save by replacing the file remove it for a moment
+            if stat == entry['stat']:
+                continue
+            entry['stat'] = stat
+            entry['generation'] += 1
+            reloads.append((entry['file'], self.submit(functools.partial(self.decode_reload, entry,
+                                                                           entry['generation']))))
+        return reloads
+
+    def decode_reload(self, entry, generation):
+        # worker side of a reload, decodes the file again and hashes it, the diff against the GPU copy happens
+        # in the upload steps so reloads of the same file apply in order
+        if entry['kind'] == 'mesh':
+            indices, vertices, decode, reserved = self.decode_within_budget(entry['file'], *entry['options'])
+            digests = [self.block_digests(data, self.block_size) for data in (vertices, indices)]
+            return self.release_after(self.update_mesh(entry, generation, indices, vertices, decode, digests), reserved)
+        from TextureLoader import decode_texture
+        width, height, img_data = decode_texture(entry['file'])
+        digests = self.block_digests(img_data, self.row_block(width))
+        return self.update_texture(entry, generation, width, height, img_data, digests)
+
+    def update_mesh(self, entry, generation, indices, vertices, decode, digests):
+        # GL steps of a mesh reload, the VBO and EBO keep their names and get the changed blocks with
+        # glBufferSubData, a buffer that outgrew its storage is reallocated and filled completely
+        import OpenGL.GL as gl
+        mesh = entry['asset'].result()
+        if generation != entry['generation']:
+            return mesh # a later edit of the file is already decoded
+        for index, (name, data) in enumerate((('VBO', vertices), ('EBO', indices))):
+            raw = memoryview(np.ascontiguousarray(data)).cast('B')
+            old = entry['digests'][index]
+            if raw.nbytes > entry['sizes'][index]:
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, mesh[name])
+                gl.glBufferData(gl.GL_ARRAY_BUFFER, raw.nbytes, None, gl.GL_STATIC_DRAW)
+                entry['sizes'][index], old = raw.nbytes, []
+            for start, stop in self.changed_ranges(old, digests[index], self.block_size, raw.nbytes, self.chunk_size):
+                yield
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, mesh[name])
+                gl.glBufferSubData(gl.GL_ARRAY_BUFFER, start, stop - start, raw[start:stop])
+        entry['digests'] = digests
+        mesh['index_count'] = len(indices)
+        mesh['index_type'] = gl.GL_UNSIGNED_SHORT if indices.itemsize == 2 else gl.GL_UNSIGNED_INT
+        mesh['decode'] = decode
+        return mesh
+
+    def update_texture(self, entry, generation, width, height, img_data, digests):
+        # GL steps of a texture reload, the changed row bands go up with glTexSubImage2D, a new size
+        # reallocates the texture under the same name
+        import OpenGL.GL as gl
+        from TextureLoader import upload_texture
+        texture = entry['asset'].result()
+        if generation != entry['generation']:
+            return texture
+        old = entry['digests']
+        if (width, height) != entry['sizes']:
+            upload_texture(texture, width, height, None)
+            entry['sizes'], old = (width, height), []
+        block = self.row_block(width)
+        for start, stop in self.changed_ranges(old, digests, block, len(img_data), max(self.chunk_size, block)):
+            yield
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, start // (width * 4), width, (stop - start) // (width * 4),
+                               gl.GL_RGBA, gl.GL_UNSIGNED_BYTE, img_data[start:stop])
+        entry['digests'] = digests
+        return texture
+
+    @staticmethod
+    def upload_mesh(indices, vertices, decode, chunk_size):
+        # GL upload steps of a mesh, the buffers fill chunk by chunk through GL_ARRAY_BUFFER so no VAO of the
+        # application is touched between the steps, the VAO is only set up in the last step
+        import OpenGL.GL as gl
+        vao, vbo, ebo = gl.glGenVertexArrays(1), gl.glGenBuffers(1), gl.glGenBuffers(1)
+        for buffer, data in ((vbo, vertices), (ebo, indices)):
+            raw = memoryview(np.ascontiguousarray(data)).cast('B')
+            gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
+            gl.glBufferData(gl.GL_ARRAY_BUFFER, raw.nbytes, None, gl.GL_STATIC_DRAW)
+            for start in range(0, raw.nbytes, chunk_size):
+                yield
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffer)
+                gl.glBufferSubData(gl.GL_ARRAY_BUFFER, start, len(raw[start:start + chunk_size]), raw[start:start + chunk_size])
+        yield
+        gl.glBindVertexArray(vao)
+        gl.glBindBuffer(gl.GL_ARRAY_BUFFER, vbo)
+        gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, ebo)
+        VertexFormat.setup_attributes(vertices.dtype)
+        gl.glBindVertexArray(0)
+        index_type = gl.GL_UNSIGNED_SHORT if indices.itemsize == 2 else gl.GL_UNSIGNED_INT
+        return {'VAO': vao, 'VBO': vbo, 'EBO': ebo, 'index_count': len(indices), 'index_type': index_type,
+                'decode': decode}
+
+    @staticmethod
+    def upload_texture(width, height, img_data, chunk_size):
+        # GL upload steps of a texture, allocated first and then filled a band of rows per step
+        import OpenGL.GL as gl
+        from TextureLoader import upload_texture
+        texture = upload_texture(gl.glGenTextures(1), width, height, None)
+        rows = max(chunk_size // (width * 4), 1)
+        for y in range(0, height, rows):
+            yield
+            count = min(rows, height - y)
+            gl.glBindTexture(gl.GL_TEXTURE_2D, texture)
+            gl.glTexSubImage2D(gl.GL_TEXTURE_2D, 0, 0, y, width, count, gl.GL_RGBA, gl.GL_UNSIGNED_BYTE,
+                               img_data[y * width * 4:(y + count) * width * 4])
+        return texture
+
+    def process_uploads(self, budget=None):
+        # runs upload steps until budget seconds (frame_budget by default) are spent, at least one step so
+        # the uploads always make progress, returns the number of assets that became ready
+        deadline = time.perf_counter() + (self.frame_budget if budget is None else budget)
+        finished = 0
+        while True:
+            if self.current is None:
+                try:
+                    self.current = self.uploads.get_nowait()
+                except queue.Empty:
+                    break
+            ready, steps = self.current
+            try:
+                next(steps)
+            except StopIteration as stop:
+                ready.set_result(stop.value)
+                self.current = None
+                finished += 1
+            except Exception as e:
+                ready.set_exception(e)
+                self.current = None
+            if time.perf_counter() >= deadline:
+                break
+        return finished
+
+    def shutdown(self, wait=True):
+        self.executor.shutdown(wait=wait)
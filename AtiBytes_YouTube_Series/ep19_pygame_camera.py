@@ -79,6 +79,8 @@ pygame.event.set_grab(True)
 cube_indices, cube_buffer = ObjLoader.load_model("meshes/cube.obj", False)
 monkey_indices, monkey_buffer = ObjLoader.load_model("meshes/monkey.obj")
 floor_indices, floor_buffer = ObjLoader.load_model("meshes/floor.obj")
+# the indexed loader picks uint16 indices for small meshes
+cube_index_type = GL_UNSIGNED_SHORT if cube_indices.itemsize == 2 else GL_UNSIGNED_INT
 
 shader = compileProgram(compileShader(vertex_src, GL_VERTEX_SHADER), compileShader(fragment_src, GL_FRAGMENT_SHADER))
 
@@ -210,7 +212,7 @@ while running:
     glBindVertexArray(VAO[0])
     glBindTexture(GL_TEXTURE_2D, textures[0])
     glUniformMatrix4fv(model_loc, 1, GL_FALSE, model)
-    glDrawElements(GL_TRIANGLES, len(cube_indices), GL_UNSIGNED_INT, None)
+    glDrawElements(GL_TRIANGLES, len(cube_indices), cube_index_type, None)
 
     # draw the monkey
     glBindVertexArray(VAO[1])
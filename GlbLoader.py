@@ -0,0 +1,207 @@
+import json
+import struct
+import numpy as np
+
+from ObjLoader import ObjLoader
+
+
+# binary glTF 2.0 (.glb) meshes in the same (indices, buffer) form as ObjLoader, the accessors are read as views
+# straight into the binary chunk, only the interleaving into the 8 float buffer copies
+class GlbLoader:
+    magic = 0x46546C67 # 'glTF'
+    json_chunk = 0x4E4F534A # 'JSON'
+    binary_chunk = 0x004E4942 # 'BIN\0'
+
+    component_types = {5120: 'i1', 5121: 'u1', 5122: '<i2', 5123: '<u2', 5125: '<u4', 5126: '<f4'}
+    type_sizes = {'SCALAR': 1, 'VEC2': 2, 'VEC3': 3, 'VEC4': 4, 'MAT4': 16}
+
+    @staticmethod
+    def read_chunks(data):
+        # returns (gltf json, binary chunk) of a .glb file held in memory, the binary chunk is a memoryview
+        magic, version, length = struct.unpack_from('<III', data, 0)
+        if magic != GlbLoader.magic or version != 2:
+            raise ValueError('not a glTF 2.0 binary file')
+        gltf, binary = None, memoryview(b'')
+        offset = 12
+        while offset < length:
+            chunk_length, chunk_type = struct.unpack_from('<II', data, offset)
+            chunk = memoryview(data)[offset + 8:offset + 8 + chunk_length]
+            if chunk_type == GlbLoader.json_chunk:
+                gltf = json.loads(bytes(chunk))
+            elif chunk_type == GlbLoader.binary_chunk and not len(binary):
+                binary = chunk
+            offset += 8 + chunk_length
+        return gltf, binary
+
+
+    @staticmethod
+    def read_accessor(gltf, binary, index):
+        # a (count, components) array over the binary chunk, strided bufferViews give a strided view, no copy
+        accessor = gltf['accessors'][index]
+        dtype = np.dtype(GlbLoader.component_types[accessor['componentType']])
+        components = GlbLoader.type_sizes[accessor['type']]
+        count = accessor['count']
+        if 'bufferView' not in accessor: # all zeros, only sparse accessors leave it out
+            return np.zeros((count, components), dtype=dtype)
+        view = gltf['bufferViews'][accessor['bufferView']]
+        if view.get('buffer', 0) != 0:
+            raise ValueError('only the binary chunk of the .glb is supported as a buffer')
+        offset = view.get('byteOffset', 0) + accessor.get('byteOffset', 0)
+        stride = view.get('byteStride', dtype.itemsize * components)
+        if stride == dtype.itemsize * components:
+            array = np.frombuffer(binary, dtype=dtype, count=count * components, offset=offset).reshape(count, components)
+        else:
+            array = np.ndarray((count, components), dtype=dtype, buffer=binary, offset=offset,
+                               strides=(stride, dtype.itemsize))
+        if accessor.get('normalized'):
+            # normalized integers, KHR_mesh_quantization uses them for positions, uvs and normals
+            info = np.iinfo(dtype)
+            array = np.maximum(array / info.max, -1.0)
+        return array
+
+
+    @staticmethod
+    def node_matrix(node):
+        # local 4x4 transform of a node in the row vector convention, p @ matrix
+        if 'matrix' in node:
+            return np.array(node['matrix'], dtype=np.float64).reshape(4, 4) # column major is row vector order
+        x, y, z, w = node.get('rotation', (0.0, 0.0, 0.0, 1.0))
+        rotation = np.array([[1 - 2 * (y * y + z * z), 2 * (x * y + z * w), 2 * (x * z - y * w)],
+                             [2 * (x * y - z * w), 1 - 2 * (x * x + z * z), 2 * (y * z + x * w)],
+                             [2 * (x * z + y * w), 2 * (y * z - x * w), 1 - 2 * (x * x + y * y)]])
+        matrix = np.eye(4)
+        matrix[:3, :3] = np.asarray(node.get('scale', (1.0, 1.0, 1.0)))[:, None] * rotation
+        matrix[3, :3] = node.get('translation', (0.0, 0.0, 0.0))
+        return matrix
+
+
+    @staticmethod
+    def mesh_instances(gltf):
+        # yields (mesh index, world matrix) for every node of the default scene that has a mesh
+        scenes = gltf.get('scenes')
+        if not scenes:
+            # no scene, every mesh once without a transform
+            for mesh in range(len(gltf.get('meshes', []))):
+                yield mesh, np.eye(4)
+            return
+        stack = [(node, np.eye(4)) for node in scenes[gltf.get('scene', 0)].get('nodes', [])]
+        while stack:
+            index, parent = stack.pop()
+            node = gltf['nodes'][index]
+            world = GlbLoader.node_matrix(node) @ parent
+            if 'mesh' in node:
+                yield node['mesh'], world
+            stack.extend((child, world) for child in node.get('children', []))
+
+
+    @staticmethod
+    def load_model(file):
+        # returns (indices, buffer) like ObjLoader.load_model(file, sorted=False), every triangle primitive of the
+        # default scene is transformed into world space and merged, missing normals are generated flat
+        with open(file, 'rb') as f:
+            data = f.read()
+        gltf, binary = GlbLoader.read_chunks(data)
+
+        parts, base = [], 0
+        for mesh, world in GlbLoader.mesh_instances(gltf):
+            for primitive in gltf['meshes'][mesh]['primitives']:
+                if primitive.get('mode', 4) != 4:
+                    continue
+                attributes = primitive['attributes']
+                positions = GlbLoader.read_accessor(gltf, binary, attributes['POSITION'])
+                count = len(positions)
+                if 'indices' in primitive:
+                    indices = GlbLoader.read_accessor(gltf, binary, primitive['indices']).ravel()
+                else:
+                    indices = np.arange(count)
+
+                buffer = np.zeros((count, 8), dtype=np.float32)
+                buffer[:, 0:3] = positions
+                if 'TEXCOORD_0' in attributes:
+                    # glTF puts the uv origin at the top left, OBJ and the textures here at the bottom left
+                    uvs = GlbLoader.read_accessor(gltf, binary, attributes['TEXCOORD_0'])
+                    buffer[:, 3] = uvs[:, 0]
+                    buffer[:, 4] = 1.0 - uvs[:, 1]
+                if 'NORMAL' in attributes:
+                    buffer[:, 5:8] = GlbLoader.read_accessor(gltf, binary, attributes['NORMAL'])
+
+                if not np.array_equal(world, np.eye(4)):
+                    buffer[:, 0:3] = buffer[:, 0:3] @ world[:3, :3] + world[3, :3]
+                    normals = buffer[:, 5:8] @ np.linalg.inv(world[:3, :3]).T
+                    buffer[:, 5:8] = normals / np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+                    if np.linalg.det(world[:3, :3]) < 0: # mirrored, keep the triangles counter clockwise
+                        indices = indices.reshape(-1, 3)[:, ::-1].ravel()
+
+                if 'NORMAL' not in attributes:
+                    # the glTF spec asks for flat normals, every corner gets its own vertex
+                    buffer = buffer[indices]
+                    p = buffer[:, 0:3].reshape(-1, 3, 3)
+                    normals = np.cross(p[:, 1] - p[:, 0], p[:, 2] - p[:, 0])
+                    normals /= np.maximum(np.linalg.norm(normals, axis=1), 1e-30)[:, None]
+                    buffer[:, 5:8] = np.repeat(normals, 3, axis=0)
+                    indices = np.arange(len(buffer))
+                parts.append((indices, buffer, base))
+                base += len(buffer)
+
+        if not parts:
+            return np.empty(0, dtype='uint16'), np.empty(0, dtype=np.float32)
+        index_type = np.dtype('uint16' if base <= 65536 else 'uint32')
+        if len(parts) == 1:
+            # a single primitive keeps the index view into the file when its type already fits
+            indices, buffer, _ = parts[0]
+            return indices.astype(index_type, copy=False), buffer.ravel()
+        indices = np.concatenate([indices.astype(np.int64) + offset for indices, _, offset in parts])
+        buffer = np.concatenate([buffer for _, buffer, _ in parts])
+        return indices.astype(index_type), buffer.ravel()
+
+
+    @staticmethod
+    def save_model(file, indices, buffer, stride=8):
+        # writes an indexed (position, uv, normal) mesh as a single primitive .glb, the vertices stay interleaved
+        vertices = np.ascontiguousarray(np.asarray(buffer, dtype=np.float32).reshape(-1, stride)[:, :8])
+        vertices[:, 4] = 1.0 - vertices[:, 4] # bottom left uv origin to the glTF top left
+        # glTF reserves the largest value of every index type for primitive restart, 65535 never fits a uint16
+        index_type = 5123 if len(vertices) < 65536 else 5125
+        index_bytes = np.asarray(indices, dtype='<u2' if index_type == 5123 else '<u4').tobytes()
+        vertex_bytes = vertices.tobytes()
+        padding = -len(index_bytes) % 4
+        binary = index_bytes + b'\0' * padding + vertex_bytes
+
+        positions = vertices[:, 0:3]
+        low = positions.min(axis=0).tolist() if len(positions) else [0.0] * 3
+        high = positions.max(axis=0).tolist() if len(positions) else [0.0] * 3
+        vertex_offset = len(index_bytes) + padding
+        gltf = {
+            'asset': {'version': '2.0', 'generator': 'PyOpenGL_examples GlbLoader'},
+            'scene': 0, 'scenes': [{'nodes': [0]}], 'nodes': [{'mesh': 0}],
+            'meshes': [{'primitives': [{'attributes': {'POSITION': 1, 'TEXCOORD_0': 2, 'NORMAL': 3},
+                                        'indices': 0, 'mode': 4}]}],
+            'buffers': [{'byteLength': len(binary)}],
+            'bufferViews': [{'buffer': 0, 'byteOffset': 0, 'byteLength': len(index_bytes), 'target': 34963},
+                            {'buffer': 0, 'byteOffset': vertex_offset, 'byteLength': len(vertex_bytes),
+                             'byteStride': 32, 'target': 34962}],
+            'accessors': [{'bufferView': 0, 'componentType': index_type, 'count': len(indices), 'type': 'SCALAR'},
+                          {'bufferView': 1, 'byteOffset': 0, 'componentType': 5126, 'count': len(vertices),
+                           'type': 'VEC3', 'min': low, 'max': high},
+                          {'bufferView': 1, 'byteOffset': 12, 'componentType': 5126, 'count': len(vertices),
+                           'type': 'VEC2'},
+                          {'bufferView': 1, 'byteOffset': 20, 'componentType': 5126, 'count': len(vertices),
+                           'type': 'VEC3'}],
+        }
+        text = json.dumps(gltf, separators=(',', ':')).encode()
+        text += b' ' * (-len(text) % 4)
+        binary += b'\0' * (-len(binary) % 4)
+
+        with open(file, 'wb') as f:
+            f.write(struct.pack('<III', GlbLoader.magic, 2, 12 + 8 + len(text) + 8 + len(binary)))
+            f.write(struct.pack('<II', len(text), GlbLoader.json_chunk))
+            f.write(text)
+            f.write(struct.pack('<II', len(binary), GlbLoader.binary_chunk))
+            f.write(binary)
+
+
+    @staticmethod
+    def convert_obj(obj_file, glb_file, scale=1.0, optimize=True):
+        # exports an .obj as .glb, welded and by default optimized for the vertex cache
+        indices, buffer = ObjLoader.load_model(obj_file, False, scale, optimize=optimize)
+        GlbLoader.save_model(glb_file, indices, buffer)
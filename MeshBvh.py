@@ -0,0 +1,175 @@
+import numpy as np
+
+
+# bounding volume hierarchy over the triangles of an indexed mesh for ray queries on the CPU, picking, line of
+# sight and collision probes without a GL context, the tree is built top down with binned SAH one level at a time
+# and a whole batch of rays walks it together, so both loop over tree levels and never over nodes or rays
+class MeshBvh:
+    def __init__(self, indices, buffer, stride=8, leaf_size=4, bins=16):
+        positions = np.asarray(buffer, dtype=np.float64).reshape(-1, stride)[:, :3]
+        triangles = positions[np.asarray(indices, dtype=np.int64).reshape(-1, 3)]
+        low, high = triangles.min(axis=1), triangles.max(axis=1)
+        centroids = (low + high) / 2
+        count = len(triangles)
+
+        # node i covers order[start[i]:start[i] + size[i]], child[i] is its left child, the right one follows it
+        order = np.arange(count)
+        start = np.zeros(max(2 * count - 1, 1), dtype=np.int64)
+        size = np.zeros_like(start)
+        child = np.full_like(start, -1)
+        size[0], nodes = count, 1
+        level = np.array([0]) if count > leaf_size else np.empty(0, dtype=np.int64)
+        while len(level):
+            starts, sizes = start[level], size[level]
+            offsets = np.cumsum(sizes) - sizes
+            owner = np.repeat(np.arange(len(level)), sizes)
+            position = np.arange(len(owner)) - offsets[owner] + starts[owner]
+            members = order[position]
+
+            # every centroid goes into one of the bins along each axis of its node's centroid bounds
+            cent = centroids[members]
+            cmin, cmax = np.minimum.reduceat(cent, offsets), np.maximum.reduceat(cent, offsets)
+            extent = cmax - cmin
+            scale = bins / np.where(extent > 0, extent, 1.0)
+            binned = np.clip(((cent - cmin[owner]) * scale[owner]).astype(np.int64), 0, bins - 1)
+
+            # triangle bounds and counts per (axis, node, bin), one sort for all three axes
+            keys = ((np.arange(3) * len(level))[:, None] + owner).ravel() * bins + binned.T.ravel()
+            counts = np.bincount(keys, minlength=3 * len(level) * bins).reshape(3, len(level), bins)
+            sort = np.argsort(keys, kind='stable')
+            sorted_keys = keys[sort]
+            first = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+            tri = np.tile(members, 3)[sort]
+            bin_low = np.full((3 * len(level) * bins, 3), np.inf)
+            bin_high = np.full((3 * len(level) * bins, 3), -np.inf)
+            bin_low[sorted_keys[first]] = np.minimum.reduceat(low[tri], first)
+            bin_high[sorted_keys[first]] = np.maximum.reduceat(high[tri], first)
+            bin_low, bin_high = bin_low.reshape(3, len(level), bins, 3), bin_high.reshape(3, len(level), bins, 3)
+
+            # SAH cost of every split plane between two bins, the left side sweeps forward, the right backward
+            left_count = np.cumsum(counts, axis=2)[:, :, :-1]
+            right_count = sizes[:, None] - left_count
+            left_area = MeshBvh.half_area(np.minimum.accumulate(bin_low, axis=2)[:, :, :-1],
+                                          np.maximum.accumulate(bin_high, axis=2)[:, :, :-1])
+            right_area = MeshBvh.half_area(np.minimum.accumulate(bin_low[:, :, ::-1], axis=2)[:, :, -2::-1],
+                                           np.maximum.accumulate(bin_high[:, :, ::-1], axis=2)[:, :, -2::-1])
+            cost = np.where((left_count > 0) & (right_count > 0),
+                            left_area * left_count + right_area * right_count, np.inf)
+            cost = cost.transpose(1, 0, 2).reshape(len(level), -1)
+            best = cost.argmin(axis=1)
+            axis, split = best // (bins - 1), best % (bins - 1) + 1
+
+            # stable partition inside every node, nodes whose centroids all fall into one bin split at the middle
+            median = np.isinf(cost[np.arange(len(level)), best])
+            left = np.where(median[owner], position - starts[owner] < (sizes // 2)[owner],
+                            binned[np.arange(len(owner)), axis[owner]] < split[owner])
+            order[position] = members[np.lexsort((~left, owner))]
+            left_size = np.bincount(owner, weights=left, minlength=len(level)).astype(np.int64)
+
+            children = nodes + 2 * np.arange(len(level))
+            child[level] = children
+            start[children], size[children] = starts, left_size
+            start[children + 1], size[children + 1] = starts + left_size, sizes - left_size
+            nodes += 2 * len(level)
+            level = np.concatenate((children, children + 1))
+            level = np.sort(level[size[level] > leaf_size])
+
+        # the bounds of every node at once, node ranges nest so each is a contiguous run of the final order
+        self.start, self.size, self.child = start[:nodes], size[:nodes], child[:nodes]
+        bounds = np.ravel(np.column_stack((start[:nodes], start[:nodes] + size[:nodes])))
+        ordered_low = np.vstack((low[order], np.zeros((1, 3))))
+        ordered_high = np.vstack((high[order], np.zeros((1, 3))))
+        self.low = np.minimum.reduceat(ordered_low, bounds)[::2] if count else np.zeros((1, 3))
+        self.high = np.maximum.reduceat(ordered_high, bounds)[::2] if count else np.zeros((1, 3))
+
+        # Moller-Trumbore needs a corner and two edges per triangle, stored in traversal order
+        ordered = triangles[order]
+        self.v0, self.e1, self.e2 = ordered[:, 0], ordered[:, 1] - ordered[:, 0], ordered[:, 2] - ordered[:, 0]
+        self.order = order # leaf slot to triangle index of the mesh
+
+    @staticmethod
+    def half_area(low, high):
+        # half the surface area of boxes, empty boxes (low inf, high -inf) have none
+        d = np.maximum(high - low, 0.0)
+        return d[..., 0] * d[..., 1] + d[..., 1] * d[..., 2] + d[..., 2] * d[..., 0]
+
+    def intersect(self, origins, directions, t_max=np.inf):
+        # closest hits of a batch of rays in the mesh space, triangles count from both sides, returns
+        # (t, triangle, barycentrics), t is inf and triangle -1 for rays that miss within t_max, barycentrics
+        # are the (n, 3) weights of the triangle corners, a direction of unit length makes t the distance
+        origins = np.atleast_2d(np.asarray(origins, dtype=np.float64))
+        directions = np.atleast_2d(np.asarray(directions, dtype=np.float64))
+        origins, directions = np.broadcast_arrays(origins, directions)
+        count = len(origins)
+        t = np.array(np.broadcast_to(t_max, count), dtype=np.float64)
+        triangle = np.full(count, -1, dtype=np.int64)
+        u, v = np.zeros(count), np.zeros(count)
+        with np.errstate(divide='ignore'):
+            inverse = 1.0 / directions
+
+        rays = np.arange(count) if len(self.order) else np.empty(0, dtype=np.int64)
+        nodes = np.zeros(len(rays), dtype=np.int64)
+        while len(rays):
+            # slab test against the node boxes, fmin and fmax skip the 0 * inf of rays inside a flat box's plane
+            with np.errstate(invalid='ignore'):
+                a = (self.low[nodes] - origins[rays]) * inverse[rays]
+                b = (self.high[nodes] - origins[rays]) * inverse[rays]
+            near = np.fmax.reduce(np.fmin(a, b), axis=1)
+            far = np.fmin.reduce(np.fmax(a, b), axis=1)
+            hit = (near <= far) & (far >= 0) & (near <= t[rays])
+            rays, nodes = rays[hit], nodes[hit]
+
+            leaf = self.child[nodes] < 0
+            if leaf.any():
+                sizes = self.size[nodes[leaf]]
+                pair_rays = np.repeat(rays[leaf], sizes)
+                slots = np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes) + \
+                    np.repeat(self.start[nodes[leaf]], sizes)
+                hit_t, hit_u, hit_v, valid = self.intersect_triangles(origins[pair_rays], directions[pair_rays], slots)
+                valid &= hit_t < t[pair_rays]
+                pair_rays, slots = pair_rays[valid], slots[valid]
+                hit_t, hit_u, hit_v = hit_t[valid], hit_u[valid], hit_v[valid]
+                # the nearest of the new hits per ray, they already beat the ray's previous one
+                nearest = np.lexsort((hit_t, pair_rays))
+                nearest = nearest[np.r_[True, pair_rays[nearest][1:] != pair_rays[nearest][:-1]]] if len(nearest) \
+                    else nearest
+                closer = pair_rays[nearest]
+                t[closer], triangle[closer] = hit_t[nearest], self.order[slots[nearest]]
+                u[closer], v[closer] = hit_u[nearest], hit_v[nearest]
+
+            rays = np.repeat(rays[~leaf], 2)
+            nodes = (self.child[nodes[~leaf]][:, None] + np.arange(2)).ravel()
+
+        t[triangle < 0] = np.inf
+        barycentrics = np.column_stack((1.0 - u - v, u, v))
+        barycentrics[triangle < 0] = 0.0
+        return t, triangle, barycentrics
+
+    def intersect_triangles(self, origins, directions, slots):
+        # Moller-Trumbore for ray i against the triangle in leaf slot slots[i], returns (t, u, v, hit)
+        e1, e2 = self.e1[slots], self.e2[slots]
+        p = np.cross(directions, e2)
+        det = np.einsum('ij,ij->i', e1, p)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inverse = 1.0 / det
+            s = origins - self.v0[slots]
+            u = np.einsum('ij,ij->i', s, p) * inverse
+            q = np.cross(s, e1)
+            v = np.einsum('ij,ij->i', directions, q) * inverse
+            t = np.einsum('ij,ij->i', e2, q) * inverse
+            hit = (det != 0) & (u >= 0) & (v >= 0) & (u + v <= 1) & (t > 0)
+        return t, u, v, hit
+
+    @staticmethod
+    def screen_rays(points, width, height, projection, view):
+        # world space (origins, directions) through window points, x right and y down like pygame mouse
+        # positions, for the row vector projection and view matrices of the episodes, multiply by the inverse
+        # model matrix to get into the mesh space of intersect
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64)) + 0.5
+        x, y = points[:, 0] * 2 / width - 1, 1 - points[:, 1] * 2 / height
+        inverse = np.linalg.inv(np.asarray(view, dtype=np.float64) @ np.asarray(projection, dtype=np.float64))
+        near = np.column_stack((x, y, -np.ones_like(x), np.ones_like(x))) @ inverse
+        far = np.column_stack((x, y, np.ones_like(x), np.ones_like(x))) @ inverse
+        near, far = near[:, :3] / near[:, 3:], far[:, :3] / far[:, 3:]
+        directions = far - near
+        return near, directions / np.linalg.norm(directions, axis=1)[:, None]
@@ -0,0 +1,134 @@
+import os
+import zlib
+import hashlib
+import threading
+import numpy as np
+
+from MeshCodec import MeshCodec
+
+
+# on-disk cache of loaded mesh arrays, every entry is a set of .npy files that are memory-mapped back on a hit,
+# with compress=True the arrays are stored as MeshCodec .mcz files instead, smaller and decoded on a hit, for
+# caches on slow or shared storage where reading the bytes costs more than inflating them
+class MeshCache:
+    suffixes = ('.npy', '.mcz')
+
+    # part of every key, bump it whenever a loader returns different arrays for the same file and options so
+    # entries written by an older version are never served again
+    version = 2
+
+    def __init__(self, directory, max_bytes=512 * 1024 * 1024, compress=False):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.compress = compress
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock() # guards the counters and the eviction, loads may run in several threads
+
+    @staticmethod
+    def make_key(file, data, *options):
+        # the key combines the cache version, the source path, its content hash and mtime and the load options
+        h = hashlib.sha1()
+        h.update(repr(MeshCache.version).encode())
+        h.update(os.path.abspath(file).encode())
+        h.update(hashlib.sha1(data).digest())
+        h.update(repr(os.path.getmtime(file)).encode())
+        h.update(repr(options).encode())
+        return h.hexdigest()
+
+    def entry_path(self, key, name):
+        return os.path.join(self.directory, '%s.%s%s' % (key, name, self.suffixes[self.compress]))
+
+    def load(self, key, names):
+        paths = [self.entry_path(key, name) for name in names]
+        try:
+            arrays = [self.read(path) for path in paths]
+        except (OSError, ValueError, SyntaxError, zlib.error): # SyntaxError from a damaged .mcz header
+            with self.lock:
+                self.misses += 1
+            return None
+        # touch the entry so the eviction treats it as recently used, a read-only cache still serves its hits
+        try:
+            for path in paths:
+                os.utime(path)
+        except OSError:
+            pass
+
+        with self.lock:
+            self.hits += 1
+        return arrays
+
+    def read(self, path):
+        if not self.compress:
+            # copy on write, hits are writeable like freshly loaded arrays and edits never reach the cache file
+            return np.load(path, mmap_mode='c')
+        with open(path, 'rb') as f:
+            return MeshCodec.decode(f.read())
+
+    def store(self, key, names, arrays):
+        # returns False when the entry could not be written, a read-only or full cache directory only costs the
+        # next load another parse, the caller keeps the arrays it already has
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            for name, array in zip(names, arrays):
+                path = self.entry_path(key, name)
+                # write to a temporary file first so a crash never leaves a truncated entry behind
+                tmp_path = '%s.%d.%d.tmp' % (path, os.getpid(), threading.get_ident())
+                try:
+                    with open(tmp_path, 'wb') as f:
+                        if self.compress:
+                            f.write(MeshCodec.encode(array))
+                        else:
+                            np.save(f, np.asarray(array)) # asarray keeps 0-d records 0-d
+                    os.replace(tmp_path, path)
+                except OSError:
+                    if os.path.exists(tmp_path):
+                        os.remove(tmp_path)
+                    raise
+        except OSError:
+            return False
+        self.evict()
+        return True
+
+    def entries(self):
+        # returns {key: [last use, size, paths]} for every cached entry
+        entries = {}
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if name.endswith(self.suffixes):
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError: # removed by another thread in the meantime
+                    continue
+                entry = entries.setdefault(name.split('.')[0], [0.0, 0, []])
+                entry[0] = max(entry[0], stat.st_mtime)
+                entry[1] += stat.st_size
+                entry[2].append(path)
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries().values())
+
+    def evict(self):
+        # drop the least recently used entries until the cache fits into max_bytes again
+        with self.lock:
+            entries = sorted(self.entries().values(), key=lambda entry: entry[0])
+            total = sum(size for _, size, _ in entries)
+            while total > self.max_bytes and entries:
+                _, size, paths = entries.pop(0)
+                for path in paths:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                total -= size
+
+    def clear(self):
+        for _, _, paths in self.entries().values():
+            for path in paths:
+                os.remove(path)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'bytes': self.size(), 'max_bytes': self.max_bytes}
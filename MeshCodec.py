@@ -0,0 +1,81 @@
+import ast
+import zlib
+import struct
+import numpy as np
+
+from VertexFormat import VertexFormat
+
+
+# lossless compression of mesh arrays in the spirit of meshoptimizer's index and vertex codecs, integer index
+# lists become zigzag deltas and other arrays byte deltas against the previous vertex, both split into byte
+# planes so zlib sees long runs of similar bytes, decoding is a few whole array numpy passes after the inflate,
+# float vertices are often too noisy for deltas, encode keeps the plain bytes when they deflate better
+class MeshCodec:
+    magic = b'MCZ1'
+
+    @staticmethod
+    def row_bytes(array):
+        # bytes per vertex, the flat float32 buffers of ObjLoader hold 8 floats per vertex, structured and
+        # multi dimensional arrays one record or row
+        if array.ndim > 1:
+            return array.dtype.itemsize * int(np.prod(array.shape[1:]))
+        if array.dtype == np.float32 and array.size % 8 == 0:
+            return VertexFormat.float_dtype.itemsize
+        return array.dtype.itemsize
+
+
+    @staticmethod
+    def encode(array, level=6):
+        # returns the compressed bytes of array, decode gives back the same dtype, shape and contents
+        array = np.asarray(array)
+        if not array.flags.c_contiguous:
+            array = array.copy() # not ascontiguousarray, it turns 0-d records into 1-d arrays
+        if array.dtype.kind in 'iu' and array.ndim == 1:
+            # index lists, vertex cache ordered triangles reference nearby vertices so the deltas stay small
+            deltas = np.diff(array.astype(np.int64), prepend=0)
+            zigzag = ((deltas << 1) ^ (deltas >> 63)).view(np.uint64)
+            width = max((int(zigzag.max()).bit_length() + 7) // 8, 1) if len(zigzag) else 1
+            mode, planes = 'index', zigzag.astype('<u8').view(np.uint8).reshape(-1, 8)[:, :width].T
+        else:
+            # vertices and records, every byte minus the same byte of the previous vertex, wrapping
+            row = MeshCodec.row_bytes(array)
+            raw = array.reshape(-1).view(np.uint8).reshape(-1, row) if array.nbytes else np.zeros((0, 1), np.uint8)
+            width = raw.shape[1]
+            mode, planes = 'delta', np.diff(raw, axis=0, prepend=np.zeros((1, width), np.uint8)).T
+        payload = zlib.compress(np.ascontiguousarray(planes).tobytes(), level)
+        if mode == 'delta':
+            plain = zlib.compress(raw.tobytes(), level)
+            if len(plain) < len(payload):
+                mode, payload, width = 'plain', plain, 1
+
+        # a python literal header like the one of .npy files
+        header = repr({'descr': np.lib.format.dtype_to_descr(array.dtype), 'shape': array.shape,
+                       'mode': mode, 'width': width}).encode()
+        return MeshCodec.magic + struct.pack('<I', len(header)) + header + payload
+
+
+    @staticmethod
+    def decode(data):
+        # inverse of encode, the returned array owns its memory and is writeable
+        if bytes(data[:4]) != MeshCodec.magic:
+            raise ValueError('not a MeshCodec stream')
+        length, = struct.unpack_from('<I', data, 4)
+        header = ast.literal_eval(bytes(data[8:8 + length]).decode())
+        dtype, shape = np.lib.format.descr_to_dtype(header['descr']), tuple(header['shape'])
+        payload = bytearray(zlib.decompress(data[8 + length:])) # writeable, the plain mode returns it as is
+        planes = np.frombuffer(payload, dtype=np.uint8).reshape(header['width'], -1)
+        if not planes.size:
+            return np.zeros(shape, dtype=dtype)
+
+        if header['mode'] == 'index':
+            # the zigzag values in the narrowest word that holds them, 32 bits for every mesh below 2^31 vertices
+            size = 4 if header['width'] <= 4 else 8
+            wide = np.zeros((planes.shape[1], size), dtype=np.uint8)
+            wide[:, :header['width']] = planes.T
+            zigzag = wide.view('<u%d' % size).ravel()
+            deltas = (zigzag >> 1).view('<i%d' % size) ^ -(zigzag & 1).view('<i%d' % size)
+            return np.cumsum(deltas, dtype=np.int64).astype(dtype).reshape(shape)
+        if header['mode'] == 'plain':
+            return planes.ravel().view(dtype).reshape(shape)
+        raw = np.ascontiguousarray(np.cumsum(planes, axis=1, dtype=np.uint8).T) # uint8 sums wrap, undoing the deltas
+        return raw.reshape(-1).view(dtype).reshape(shape)
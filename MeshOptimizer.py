@@ -0,0 +1,571 @@
+import heapq
+import math
+import numpy as np
+
+
+# optimization passes over the indexed meshes returned by ObjLoader.load_model(file, sorted=False)
+class MeshOptimizer:
+    # vertex cache scoring constants from Tom Forsyth's linear-speed vertex cache optimisation
+    cache_size = 32
+    cache_decay_power = 1.5
+    last_triangle_score = 0.75
+    valence_boost_scale = 2.0
+    valence_boost_power = 0.5
+
+    @staticmethod
+    def adjacency(indices, vertex_count):
+        # returns (offsets, triangles) where triangles[offsets[v]:offsets[v + 1]] are the triangles using vertex v
+        flat = np.asarray(indices, dtype=np.int64)
+        order = np.argsort(flat, kind='stable')
+        offsets = np.concatenate(([0], np.cumsum(np.bincount(flat, minlength=vertex_count))))
+        return offsets, order // 3
+
+
+    @staticmethod
+    def vertex_scores(max_valence):
+        # precomputed score tables, indexed by cache position and by remaining triangle count
+        size = MeshOptimizer.cache_size
+        position_score = [MeshOptimizer.last_triangle_score] * 3
+        for i in range(3, size):
+            position_score.append((1.0 - (i - 3) / (size - 3)) ** MeshOptimizer.cache_decay_power)
+        valence_score = [0.0] + [MeshOptimizer.valence_boost_scale * n ** -MeshOptimizer.valence_boost_power
+                                 for n in range(1, max_valence + 1)]
+        return position_score, valence_score
+
+
+    @staticmethod
+    def optimize_vertex_cache(indices, vertex_count):
+        # reorders the triangles so consecutive triangles reuse the vertices still in the post-transform cache
+        num_triangles = len(indices) // 3
+        if num_triangles == 0:
+            return np.asarray(indices).copy()
+        offsets, adjacent = MeshOptimizer.adjacency(indices, vertex_count)
+        triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3).tolist()
+        offsets, adjacent = offsets.tolist(), adjacent.tolist()
+
+        valence = np.diff(offsets).tolist() # triangles not yet emitted per vertex
+        position_score, valence_score = MeshOptimizer.vertex_scores(max(valence))
+        position = [-1] * vertex_count
+        score = [valence_score[n] for n in valence]
+        triangle_score = [score[a] + score[b] + score[c] for a, b, c in triangles]
+        emitted = [False] * num_triangles
+
+        cache = []
+        order = []
+        next_unemitted = 0
+        best = max(range(num_triangles), key=triangle_score.__getitem__)
+        while True:
+            if best < 0:
+                # dead end, none of the cached vertices has triangles left, continue in input order
+                while next_unemitted < num_triangles and emitted[next_unemitted]:
+                    next_unemitted += 1
+                if next_unemitted == num_triangles:
+                    break
+                best = next_unemitted
+
+            order.append(best)
+            emitted[best] = True
+            triangle = triangles[best]
+            for v in triangle:
+                valence[v] -= 1
+
+            # move the triangle to the front of the LRU cache
+            cache = triangle + [v for v in cache if v not in triangle]
+            evicted = cache[MeshOptimizer.cache_size:]
+            cache = cache[:MeshOptimizer.cache_size]
+            for v in evicted:
+                position[v] = -1
+
+            # rescore the touched vertices and push the difference into their remaining triangles
+            best, best_score = -1, -1.0
+            for i, v in enumerate(cache + evicted):
+                if i < len(cache):
+                    position[v] = i
+                new_score = valence_score[valence[v]] + (position_score[i] if i < len(cache) else 0.0)
+                delta = new_score - score[v]
+                score[v] = new_score
+                for t in adjacent[offsets[v]:offsets[v + 1]]:
+                    if emitted[t]:
+                        continue
+                    triangle_score[t] += delta
+                    if i < len(cache) and triangle_score[t] > best_score:
+                        best, best_score = t, triangle_score[t]
+
+        ordered = np.asarray(triangles, dtype=np.int64)[order].ravel()
+        return ordered.astype(np.asarray(indices).dtype)
+
+
+    @staticmethod
+    def optimize_vertex_fetch(indices, buffer, stride=8):
+        # renumbers the vertices in the order the index buffer first uses them and reorders the buffer to match
+        vertices = np.asarray(buffer).reshape(-1, stride)
+        _, first = np.unique(indices, return_index=True)
+        used = np.asarray(indices)[np.sort(first)]
+        remap = np.full(len(vertices), -1, dtype=np.int64)
+        remap[used] = np.arange(len(used))
+        return remap[indices].astype(np.asarray(indices).dtype), vertices[used].ravel()
+
+
+    @staticmethod
+    def cache_misses(indices, cache_size=16, boundaries=()):
+        # per triangle number of FIFO cache misses, the cache is flushed at the given triangle boundaries
+        cache = [-1] * cache_size
+        cached = set()
+        head = 0
+        flush = set(boundaries)
+        misses = []
+        for t, triangle in enumerate(np.asarray(indices).reshape(-1, 3).tolist()):
+            if t in flush:
+                cache = [-1] * cache_size
+                cached = set()
+            count = 0
+            for v in triangle:
+                if v not in cached:
+                    count += 1
+                    cached.discard(cache[head])
+                    cache[head] = v
+                    cached.add(v)
+                    head = (head + 1) % cache_size
+            misses.append(count)
+        return misses
+
+
+    @staticmethod
+    def optimize_overdraw(indices, buffer, stride=8, threshold=1.2):
+        # splits a vertex cache optimized index buffer into clusters and draws the clusters facing away
+        # from the mesh center first, based on Sander et al. "Fast Triangle Reordering for Vertex Locality
+        # and Reduced Overdraw", threshold is how much ACMR the split may cost
+        triangles = np.asarray(indices).reshape(-1, 3)
+        if len(triangles) == 0:
+            return np.asarray(indices).copy()
+
+        # hard boundaries where the cache starts cold: all three vertices of a triangle miss
+        misses = MeshOptimizer.cache_misses(indices)
+        hard = [t for t, count in enumerate(misses) if count == 3 or t == 0]
+
+        # soft boundaries inside every hard cluster, as soon as the running ACMR drops to the cluster ACMR * threshold
+        bounds = []
+        restarted = MeshOptimizer.cache_misses(indices, boundaries=hard)
+        for start, end in zip(hard, hard[1:] + [len(triangles)]):
+            cluster_acmr = sum(restarted[start:end]) / (end - start)
+            bounds.append(start)
+            running = MeshOptimizer.cache_misses(triangles[start:end])
+            segment_misses = segment_start = 0
+            for t in range(end - start):
+                segment_misses += running[t]
+                if segment_misses <= (t + 1 - segment_start) * cluster_acmr * threshold and t + 1 < end - start:
+                    bounds.append(start + t + 1)
+                    running[t + 1:] = MeshOptimizer.cache_misses(triangles[start + t + 1:end])
+                    segment_misses, segment_start = 0, t + 1
+        clusters = np.repeat(np.arange(len(bounds)), np.diff(bounds + [len(triangles)]))
+
+        # sort key: how far the cluster lies out along its own average normal, seen from the mesh centroid
+        positions = np.asarray(buffer).reshape(-1, stride)[:, :3].astype(np.float64)
+        a, b, c = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+        normals = np.cross(b - a, c - a) # length is twice the triangle area
+        areas = np.linalg.norm(normals, axis=1)
+        centroids = (a + b + c) / 3.0
+        mesh_centroid = (centroids * areas[:, None]).sum(axis=0) / max(areas.sum(), 1e-30)
+
+        cluster_area = np.bincount(clusters, weights=areas)
+        cluster_centroid = np.stack([np.bincount(clusters, weights=centroids[:, i] * areas) for i in range(3)], axis=1)
+        cluster_centroid /= np.maximum(cluster_area, 1e-30)[:, None]
+        cluster_normal = np.stack([np.bincount(clusters, weights=normals[:, i]) for i in range(3)], axis=1)
+        cluster_normal /= np.maximum(np.linalg.norm(cluster_normal, axis=1), 1e-30)[:, None]
+        sort_key = ((cluster_centroid - mesh_centroid) * cluster_normal).sum(axis=1)
+
+        order = np.argsort(-sort_key[clusters], kind='stable')
+        return triangles[order].ravel()
+
+
+    @staticmethod
+    def analyze_overdraw(indices, buffer, stride=8, resolution=256):
+        # software rasterizes the mesh with back face culling and a depth test along the six axis directions,
+        # returns shaded fragments / covered pixels, 1.0 means no pixel was shaded twice
+        positions = np.asarray(buffer).reshape(-1, stride)[:, :3].astype(np.float64)
+        triangles = np.asarray(indices).reshape(-1, 3)
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        grid = (positions - low) / np.maximum((high - low).max(), 1e-30) * (resolution - 1)
+
+        shaded = covered = 0
+        for axis in range(3):
+            u, v = [(1, 2), (2, 0), (0, 1)][axis]
+            for sign in (1.0, -1.0):
+                # looking along -sign * axis, depth grows away from the viewer
+                xy = grid[:, [u, v]] * (sign, 1.0)
+                xy[:, 0] += (resolution - 1) if sign < 0 else 0.0
+                depth = -sign * grid[:, axis]
+                zbuffer = np.full((resolution, resolution), np.inf)
+                for i0, i1, i2 in triangles.tolist():
+                    (x0, y0), (x1, y1), (x2, y2) = xy[i0], xy[i1], xy[i2]
+                    area = (x1 - x0) * (y2 - y0) - (x2 - x0) * (y1 - y0)
+                    if area <= 0.0:
+                        continue # back facing or degenerate
+                    xmin, xmax = int(np.ceil(min(x0, x1, x2))), int(max(x0, x1, x2))
+                    ymin, ymax = int(np.ceil(min(y0, y1, y2))), int(max(y0, y1, y2))
+                    if xmin > xmax or ymin > ymax:
+                        continue
+                    py, px = np.mgrid[ymin:ymax + 1, xmin:xmax + 1]
+                    w0 = (x2 - x1) * (py - y1) - (y2 - y1) * (px - x1)
+                    w1 = (x0 - x2) * (py - y2) - (y0 - y2) * (px - x2)
+                    w2 = area - w0 - w1
+                    inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+                    if not inside.any():
+                        continue
+                    z = (w0 * depth[i0] + w1 * depth[i1] + w2 * depth[i2]) / area
+                    tile = zbuffer[ymin:ymax + 1, xmin:xmax + 1]
+                    passed = inside & (z < tile)
+                    shaded += int(passed.sum())
+                    tile[passed] = z[passed]
+                covered += int(np.isfinite(zbuffer).sum())
+        return shaded / max(covered, 1)
+
+
+    @staticmethod
+    def quadric_error(quadric, x, y, z):
+        # v^T Q v for v = (x, y, z, 1) and the upper triangle coefficients of Q row by row, works on floats and
+        # on arrays alike so the batched and the single costs of simplify round the same way
+        q00, q01, q02, q03, q11, q12, q13, q22, q23, q33 = quadric
+        return (x * (q00 * x + 2.0 * (q01 * y + q02 * z + q03)) + y * (q11 * y + 2.0 * (q12 * z + q13)) +
+                z * (q22 * z + 2.0 * q23) + q33)
+
+
+    @staticmethod
+    def triangle_normal(a, b, c):
+        # cross product of the edges a-b and a-c of a triangle of (x, y, z) float triples
+        ux, uy, uz = b[0] - a[0], b[1] - a[1], b[2] - a[2]
+        vx, vy, vz = c[0] - a[0], c[1] - a[1], c[2] - a[2]
+        return uy * vz - uz * vy, uz * vx - ux * vz, ux * vy - uy * vx
+
+
+    @staticmethod
+    def simplify(indices, buffer, target_ratio=0.5, target_error=0.01, stride=8):
+        # quadric error metric simplification with half-edge collapses: a position moves onto a neighboring
+        # position and its vertices are replaced by the neighbor's vertices, so the vertex buffer stays untouched
+        # and only a new index buffer is returned, uv/normal seams only collapse along the seam and open borders
+        # never move, stops at target_ratio of the triangles or when the next collapse would move the surface
+        # by more than target_error times the mesh extent
+        triangles = np.asarray(indices, dtype=np.int64).reshape(-1, 3)
+        vertices = np.asarray(buffer).reshape(-1, stride)[:, :3].astype(np.float64)
+        target_count = int(len(triangles) * target_ratio)
+        if len(triangles) == 0 or target_count >= len(triangles):
+            return np.asarray(indices).copy()
+
+        # collapses work on welded positions, the split vertices of a seam share one position
+        positions, position_of = np.unique(vertices, axis=0, return_inverse=True)
+        position_of = position_of.ravel()
+        corners = position_of[triangles]
+        extent = np.ptp(positions[np.unique(corners)], axis=0).max()
+        max_cost = (target_error * extent) ** 2
+
+        # area weighted plane quadrics, accumulated per position, the ten upper triangle coefficients of every
+        # symmetric 4x4 matrix in the order quadric_error expects
+        a, b, c = positions[corners[:, 0]], positions[corners[:, 1]], positions[corners[:, 2]]
+        normals = np.cross(b - a, c - a)
+        areas = np.linalg.norm(normals, axis=1)
+        unit = normals / np.maximum(areas, 1e-30)[:, None]
+        planes = np.concatenate((unit, -(unit * a).sum(axis=1, keepdims=True)), axis=1)
+        rows, columns = np.triu_indices(4)
+        face_quadrics = planes[:, rows] * planes[:, columns] * (areas / 2.0)[:, None]
+        quadrics = np.zeros((len(positions), 10))
+        for corner in range(3):
+            np.add.at(quadrics, corners[:, corner], face_quadrics)
+
+        # positions on an edge used by a single triangle lie on an open border and are locked
+        edges = np.sort(corners[:, [0, 1, 1, 2, 2, 0]].reshape(-1, 2), axis=1)
+        unique_edges, edge_count = np.unique(edges, axis=0, return_counts=True)
+        locked = np.zeros(len(positions), dtype=bool)
+        locked[unique_edges[edge_count == 1].ravel()] = True
+
+        # the cost of collapsing p onto q is the error of Qp at q plus the error of Qq at q, the second term is
+        # kept per position, the first costs of every edge in both directions are computed at once
+        errors = MeshOptimizer.quadric_error(quadrics.T, *positions.T)
+        pairs = corners[:, [0, 1, 1, 2, 2, 0, 1, 0, 2, 1, 0, 2]].reshape(-1, 2)
+        pairs = np.unique(pairs[:, 0] * len(positions) + pairs[:, 1])
+        pairs = np.stack(np.divmod(pairs, len(positions)), axis=1)
+        pairs = pairs[(pairs[:, 0] != pairs[:, 1]) & ~locked[pairs[:, 0]]]
+        costs = MeshOptimizer.quadric_error(quadrics[pairs[:, 0]].T, *positions[pairs[:, 1]].T) + errors[pairs[:, 1]]
+        zeros = [0] * len(pairs)
+        heap = list(zip(costs.tolist(), pairs[:, 0].tolist(), pairs[:, 1].tolist(), zeros, zeros))
+        heapq.heapify(heap)
+
+        # the collapse loop runs on plain python floats, numpy calls on single vectors cost more than the math
+        faces = triangles.tolist()
+        position_of = position_of.tolist()
+        points = positions.tolist()
+        quadrics = quadrics.tolist()
+        errors = errors.tolist()
+        normals = normals.tolist()
+        locked = locked.tolist()
+        alive = [True] * len(faces)
+        position_faces = [set() for _ in range(len(positions))]
+        for f, face in enumerate(faces):
+            for v in face:
+                position_faces[position_of[v]].add(f)
+        version = [0] * len(positions)
+        retry = [[] for _ in range(len(positions))]
+
+        def push_edge(heap, p, q):
+            if not locked[p]:
+                cost = MeshOptimizer.quadric_error(quadrics[p], *points[q]) + errors[q]
+                heapq.heappush(heap, (cost, p, q, version[p], version[q]))
+
+        def vertex_map(p, q):
+            # every vertex at p has to share a triangle with a vertex at q, that vertex replaces it,
+            # fails when p lies on a seam that the edge p-q does not follow
+            remap = {}
+            for f in position_faces[p]:
+                face = faces[f]
+                targets = [v for v in face if position_of[v] == q]
+                for v in face:
+                    if position_of[v] == p and targets:
+                        if remap.setdefault(v, targets[0]) != targets[0]:
+                            return None
+            sources = {v for f in position_faces[p] for v in faces[f] if position_of[v] == p}
+            return remap if len(remap) == len(sources) else None
+
+        remaining = len(faces)
+        while remaining > target_count and heap:
+            cost, p, q, version_p, version_q = heapq.heappop(heap)
+            if cost > max_cost:
+                break
+            if version_p != version[p] or version_q != version[q] or not position_faces[p]:
+                continue # stale entry
+            remap = vertex_map(p, q)
+            if remap is None:
+                retry[p].append(q)
+                continue
+
+            # moving p onto q must not flip any of the triangles that survive the collapse
+            shared = position_faces[p] & position_faces[q]
+            flipped = False
+            for f in position_faces[p] - shared:
+                corner = [points[q] if position_of[v] == p else points[position_of[v]] for v in faces[f]]
+                nx, ny, nz = MeshOptimizer.triangle_normal(*corner)
+                ox, oy, oz = normals[f]
+                if nx * ox + ny * oy + nz * oz <= 0.0:
+                    flipped = True
+                    break
+            if flipped:
+                retry[p].append(q)
+                continue
+
+            moved = {position_of[v] for f in position_faces[p] for v in faces[f]} - {p, q}
+            for f in shared:
+                alive[f] = False
+                for v in faces[f]:
+                    position_faces[position_of[v]].discard(f)
+                remaining -= 1
+            for f in position_faces[p]:
+                faces[f] = [remap.get(v, v) for v in faces[f]]
+                normals[f] = MeshOptimizer.triangle_normal(*[points[position_of[v]] for v in faces[f]])
+                position_faces[q].add(f)
+            position_faces[p] = set()
+            quadrics[q] = [a + b for a, b in zip(quadrics[q], quadrics[p])]
+            errors[q] = MeshOptimizer.quadric_error(quadrics[q], *points[q])
+
+            # only the edges from and to q change their cost, old heap entries are recognized by their version
+            # stamps, edges around p that failed the seam or the flip test are tried again on the moved triangles
+            version[p] += 1
+            version[q] += 1
+            retry[q] = []
+            for r in {position_of[v] for f in position_faces[q] for v in faces[f]} - {q}:
+                push_edge(heap, q, r)
+                push_edge(heap, r, q)
+            for r in moved:
+                for s in retry[r]:
+                    if s != q and position_faces[s]:
+                        push_edge(heap, r, s)
+                retry[r] = []
+
+        result = np.array([faces[f] for f in range(len(faces)) if alive[f]], dtype=np.int64).ravel()
+        return result.astype(np.asarray(indices).dtype)
+
+
+    @staticmethod
+    def lod_chain(indices, buffer, ratios=(1.0, 0.5, 0.25, 0.1), target_error=0.05, stride=8):
+        # simplifies every level from the previous one, all levels share the vertex buffer of the full mesh
+        lods = []
+        for ratio in ratios:
+            source = lods[-1] if lods else indices
+            if ratio >= 1.0:
+                lods.append(np.asarray(indices).copy())
+                continue
+            target = ratio * len(indices) / max(len(source), 1)
+            lods.append(MeshOptimizer.simplify(source, buffer, min(target, 1.0), target_error, stride))
+        return lods
+
+
+    # per cluster record of build_meshlets, the index range is what glDrawElements draws for the cluster
+    meshlet_dtype = np.dtype([('index_offset', 'u4'), ('index_count', 'u4'), ('vertex_count', 'u4'),
+                              ('center', 'f4', 3), ('radius', 'f4'),
+                              ('cone_apex', 'f4', 3), ('cone_axis', 'f4', 3), ('cone_cutoff', 'f4')])
+
+    @staticmethod
+    def build_meshlets(indices, buffer, max_vertices=64, max_triangles=124, cone_limit=0.25, stride=8):
+        # grows clusters of at most max_vertices distinct vertices and max_triangles triangles over the mesh,
+        # the next triangle is the neighbor that adds the fewest new vertices and bends the cluster's normal
+        # cone the least, neighbors more than acos(cone_limit) off the cluster normal start a new cluster so
+        # that the clusters stay back face cullable, returns the index buffer with every cluster contiguous
+        # and one meshlet_dtype record per cluster
+        triangles = np.asarray(indices).reshape(-1, 3)
+        positions = np.asarray(buffer).reshape(-1, stride)[:, :3].astype(np.float64)
+        a, b, c = positions[triangles[:, 0]], positions[triangles[:, 1]], positions[triangles[:, 2]]
+        normals = np.cross(b - a, c - a)
+        lengths = np.linalg.norm(normals, axis=1)
+        normals /= np.maximum(lengths, 1e-30)[:, None]
+        centroids = (a + b + c) / 3.0
+
+        # neighbors share a welded position, so clusters also grow across uv and normal seams
+        _, position_of = np.unique(positions, axis=0, return_inverse=True)
+        offsets, adjacent = MeshOptimizer.adjacency(position_of.ravel()[triangles].ravel(), position_of.max() + 1)
+        position_of, offsets, adjacent = position_of.ravel().tolist(), offsets.tolist(), adjacent.tolist()
+        faces = triangles.tolist()
+        normal_list = normals.tolist()
+        degenerate = (lengths == 0).tolist() # fit into any cluster
+
+        # candidates are bucketed by the number of vertices they would add, the vertex to triangle lists keep
+        # the buckets up to date as the cluster grows, the loop runs on plain python floats
+        vertex_offsets, vertex_adjacent = MeshOptimizer.adjacency(triangles.ravel(), len(positions))
+        vertex_offsets, vertex_adjacent = vertex_offsets.tolist(), vertex_adjacent.tolist()
+        cluster_of = [-1] * len(faces)
+        cluster = -1
+        seed = 0
+        while True:
+            while seed < len(faces) and cluster_of[seed] >= 0:
+                seed += 1
+            if seed == len(faces):
+                break
+            cluster += 1
+            used, count, ax, ay, az = set(), 0, 0.0, 0.0, 0.0
+            added = {seed: len(set(faces[seed]))}
+            buckets = [set(), set(), set(), set()]
+            buckets[added[seed]].add(seed)
+            while added and count < max_triangles:
+                length = max(math.sqrt(ax * ax + ay * ay + az * az), 1e-30)
+                ux, uy, uz = ax / length, ay / length, az / length
+                best = -1
+                for new, bucket in enumerate(buckets):
+                    if len(used) + new > max_vertices:
+                        break
+                    best_alignment = -2.0
+                    for t in bucket:
+                        if count and not degenerate[t]:
+                            nx, ny, nz = normal_list[t]
+                            alignment = ux * nx + uy * ny + uz * nz
+                        else:
+                            alignment = 1.0
+                        if alignment >= cone_limit and alignment > best_alignment:
+                            best, best_alignment = t, alignment
+                    if best >= 0:
+                        break
+                if best < 0:
+                    break
+                cluster_of[best] = cluster
+                buckets[added.pop(best)].discard(best)
+                nx, ny, nz = normal_list[best]
+                ax, ay, az = ax + nx, ay + ny, az + nz
+                count += 1
+                for v in set(faces[best]) - used:
+                    used.add(v)
+                    for t in set(vertex_adjacent[vertex_offsets[v]:vertex_offsets[v + 1]]):
+                        if t in added:
+                            buckets[added[t]].discard(t)
+                            added[t] -= 1
+                            buckets[added[t]].add(t)
+                for v in faces[best]:
+                    p = position_of[v]
+                    for t in adjacent[offsets[p]:offsets[p + 1]]:
+                        if cluster_of[t] < 0 and t not in added:
+                            added[t] = len(set(faces[t]) - used)
+                            buckets[added[t]].add(t)
+
+        cluster_of = np.array(cluster_of, dtype=np.int64)
+        order = np.argsort(cluster_of, kind='stable')
+        triangles, cluster_of = triangles[order], cluster_of[order]
+        normals, lengths, centroids = normals[order], lengths[order], centroids[order]
+        counts = np.bincount(cluster_of)
+        ends = np.cumsum(counts)
+        meshlets = np.zeros(len(counts), dtype=MeshOptimizer.meshlet_dtype)
+        meshlets['index_offset'] = (ends - counts) * 3
+        meshlets['index_count'] = counts * 3
+
+        for m, (start, end) in enumerate(zip((ends - counts).tolist(), ends.tolist())):
+            used = np.unique(triangles[start:end])
+            points = positions[used]
+            center = (points.min(axis=0) + points.max(axis=0)) / 2.0
+            meshlets[m]['vertex_count'] = len(used)
+            meshlets[m]['center'] = center
+            meshlets[m]['radius'] = np.sqrt(((points - center) ** 2).sum(axis=1).max())
+
+            # normal cone, the cluster is back facing for any camera inside the cone behind the apex
+            # degenerate triangles are never rasterized and do not widen the cone
+            valid = lengths[start:end] > 0
+            n = normals[start:end][valid]
+            axis = n.sum(axis=0)
+            axis /= max(np.linalg.norm(axis), 1e-30)
+            min_dot = min((n @ axis).min(), 1.0) if len(n) else 0.0
+            if min_dot <= 0.1:
+                # the normals spread over more than a hemisphere, the cluster can never be back face culled
+                meshlets[m]['cone_apex'] = center
+                meshlets[m]['cone_axis'] = axis
+                meshlets[m]['cone_cutoff'] = 1.0
+                continue
+            # the apex is moved back along the axis until it lies behind the plane of every triangle
+            distance = max((((center - centroids[start:end][valid]) * n).sum(axis=1) / (n @ axis)).max(), 0.0)
+            meshlets[m]['cone_apex'] = center - axis * distance
+            meshlets[m]['cone_axis'] = axis
+            meshlets[m]['cone_cutoff'] = np.sqrt(1.0 - min_dot * min_dot)
+
+        return triangles.ravel().astype(np.asarray(indices).dtype), meshlets
+
+
+    @staticmethod
+    def frustum_planes(matrix):
+        # the six clip planes (a, b, c, d) of a pyrr style model-view-projection matrix, p @ matrix = clip position,
+        # a point is inside when a*x + b*y + c*z + d >= 0 for all of them
+        m = np.asarray(matrix, dtype=np.float64)
+        planes = np.array([m[:, 3] + m[:, 0], m[:, 3] - m[:, 0], m[:, 3] + m[:, 1],
+                           m[:, 3] - m[:, 1], m[:, 3] + m[:, 2], m[:, 3] - m[:, 2]])
+        return planes / np.linalg.norm(planes[:, :3], axis=1)[:, None]
+
+
+    @staticmethod
+    def cull_meshlets(meshlets, camera_position, planes=None):
+        # returns a mask of the clusters that can be visible, camera_position and planes are in model space,
+        # clusters completely outside a frustum plane or facing away from the camera are dropped
+        camera_position = np.asarray(camera_position, dtype=np.float64)
+        view = meshlets['cone_apex'] - camera_position
+        view /= np.maximum(np.linalg.norm(view, axis=1), 1e-30)[:, None]
+        visible = (view * meshlets['cone_axis']).sum(axis=1) < meshlets['cone_cutoff']
+        if planes is not None:
+            distance = meshlets['center'] @ planes[:, :3].T + planes[:, 3]
+            visible &= np.all(distance >= -meshlets['radius'][:, None], axis=1)
+        return visible
+
+
+    @staticmethod
+    def optimize(indices, buffer, stride=8, overdraw=False):
+        # vertex cache pass, optionally the overdraw pass and finally the vertex fetch pass
+        indices = MeshOptimizer.optimize_vertex_cache(indices, len(buffer) // stride)
+        if overdraw:
+            indices = MeshOptimizer.optimize_overdraw(indices, buffer, stride).astype(indices.dtype)
+        return MeshOptimizer.optimize_vertex_fetch(indices, buffer, stride)
+
+
+    @staticmethod
+    def analyze_vertex_cache(indices, vertex_count=None, cache_size=16):
+        # simulates a FIFO post-transform cache, returns (ACMR, ATVR): transformed vertices per triangle
+        # and per vertex, 0.5 and 1.0 are the best case for large regular meshes
+        cache = [-1] * cache_size
+        cached = set()
+        head = misses = 0
+        for v in np.asarray(indices).tolist():
+            if v not in cached:
+                misses += 1
+                cached.discard(cache[head])
+                cache[head] = v
+                cached.add(v)
+                head = (head + 1) % cache_size
+        used = len(np.unique(indices)) if vertex_count is None else vertex_count
+        return misses / max(len(indices) // 3, 1), misses / max(used, 1)
@@ -0,0 +1,121 @@
+import hashlib
+import threading
+import numpy as np
+
+from ObjLoader import ObjLoader
+from VertexFormat import VertexFormat
+
+
+# content addressed store of loaded meshes, identical vertex or index arrays are kept and uploaded once no matter
+# which file or call they came from, a mesh handle is the (vertex digest, index digest) pair
+class MeshStore:
+    def __init__(self):
+        self.arrays = {} # digest: [array, references, GL buffer or None]
+        self.handles = {} # handle: [references, VAO or None]
+        self.sources = {} # content hash and load options of a file: handle
+        self.lock = threading.Lock() # guards the tables, loads may run in several threads
+
+    @staticmethod
+    def digest(array):
+        # the dtype and shape are part of the address, the same bytes in another layout are another array
+        array = np.ascontiguousarray(array)
+        h = hashlib.sha1()
+        h.update(repr((array.dtype.descr, array.shape)).encode())
+        h.update(memoryview(array).cast('B'))
+        return h.hexdigest()
+
+    def add(self, indices, buffer):
+        # returns the handle of the mesh, arrays already in the store are shared instead of kept twice
+        handle = (self.digest(buffer), self.digest(indices))
+        with self.lock:
+            for digest, array in zip(handle, (buffer, indices)):
+                self.arrays.setdefault(digest, [array, 0, None])
+            self.handles.setdefault(handle, [0, None])
+            self.reference(handle)
+        return handle
+
+    def reference(self, handle):
+        # counts one more user of the mesh and its arrays, call with the lock held
+        self.handles[handle][0] += 1
+        for digest in handle:
+            self.arrays[digest][1] += 1
+
+    def load(self, file, **options):
+        # loads an .obj with ObjLoader.load_model(file, sorted=False, **options), files with the same content share
+        # the parse too, the store holds indexed meshes only
+        if options.pop('sorted', False):
+            raise ValueError('MeshStore keeps indexed meshes, sorted=True is not supported')
+        options['sorted'] = False
+        with open(file, 'rb') as f:
+            source = (hashlib.sha1(f.read()).hexdigest(), tuple(sorted(options.items())))
+        with self.lock:
+            handle = self.sources.get(source)
+            if handle in self.handles:
+                self.reference(handle)
+                return handle
+        handle = self.add(*ObjLoader.load_model(file, **options)[:2])
+        with self.lock:
+            self.sources[source] = handle
+        return handle
+
+    def get(self, handle):
+        # returns (indices, buffer) of the mesh
+        return self.arrays[handle[1]][0], self.arrays[handle[0]][0]
+
+    def upload(self, handle):
+        # returns {'VAO', 'VBO', 'EBO', 'index_count', 'index_type'}, the buffers are created on the first upload
+        # of an array and shared by every handle using it, call with the GL context current
+        import OpenGL.GL as gl
+        with self.lock:
+            buffers = []
+            for digest in handle:
+                entry = self.arrays[digest]
+                if entry[2] is None:
+                    entry[2] = gl.glGenBuffers(1)
+                    gl.glBindBuffer(gl.GL_ARRAY_BUFFER, entry[2])
+                    gl.glBufferData(gl.GL_ARRAY_BUFFER, entry[0].nbytes, np.ascontiguousarray(entry[0]), gl.GL_STATIC_DRAW)
+                buffers.append(entry[2])
+
+            indices, buffer = self.get(handle)
+            mesh = self.handles[handle]
+            if mesh[1] is None:
+                mesh[1] = gl.glGenVertexArrays(1)
+                gl.glBindVertexArray(mesh[1])
+                gl.glBindBuffer(gl.GL_ARRAY_BUFFER, buffers[0])
+                gl.glBindBuffer(gl.GL_ELEMENT_ARRAY_BUFFER, buffers[1])
+                VertexFormat.setup_attributes(buffer.dtype if buffer.dtype.names else VertexFormat.float_dtype)
+                gl.glBindVertexArray(0)
+
+        index_type = gl.GL_UNSIGNED_SHORT if indices.itemsize == 2 else gl.GL_UNSIGNED_INT
+        return {'VAO': mesh[1], 'VBO': buffers[0], 'EBO': buffers[1], 'index_count': len(indices),
+                'index_type': index_type}
+
+    def release(self, handle):
+        # drops one reference to the mesh, arrays and GL objects nobody references any more are freed
+        with self.lock:
+            mesh = self.handles[handle]
+            mesh[0] -= 1
+            if mesh[0] == 0:
+                del self.handles[handle]
+                self.sources = {source: other for source, other in self.sources.items() if other != handle}
+                if mesh[1] is not None:
+                    import OpenGL.GL as gl
+                    gl.glDeleteVertexArrays(1, [mesh[1]])
+            for digest in handle:
+                entry = self.arrays[digest]
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self.arrays[digest]
+                    if entry[2] is not None:
+                        import OpenGL.GL as gl
+                        gl.glDeleteBuffers(1, [entry[2]])
+
+    def stats(self):
+        # bytes held against the bytes every reference would hold on its own
+        with self.lock:
+            stored = sum(entry[0].nbytes for entry in self.arrays.values())
+            requested = sum(references * (self.arrays[handle[0]][0].nbytes + self.arrays[handle[1]][0].nbytes)
+                            for handle, (references, _) in self.handles.items())
+            return {'meshes': len(self.handles), 'references': sum(mesh[0] for mesh in self.handles.values()),
+                    'arrays': len(self.arrays), 'bytes': stored, 'requested_bytes': requested,
+                    'saved_bytes': requested - stored}
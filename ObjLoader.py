@@ -1,57 +1,397 @@
+import os
+import re
+import mmap
 import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
+from MeshCache import MeshCache
+from MeshOptimizer import MeshOptimizer
+from VertexFormat import VertexFormat
 
+
+# every load keeps its state in local variables, so load_model can run in several threads at once
 class ObjLoader:
-    buffer = []
+    # parsed models are cached on disk next to this file, set to None to always parse
+    cache = MeshCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.mesh_cache'))
+
+    keywords = (b'v', b'vt', b'vn', b'f')
+
+    # crease angle in degrees used for files without vn records, and the most smoothing groups generate_normals
+    # splits the corners of one position into
+    crease_angle = 60.0
+    crease_clusters = 8
+
+    # one draw range of load_submeshes, index_offset and index_count count indices, material and group index
+    # into the name lists returned with the ranges
+    range_dtype = np.dtype([('index_offset', 'u4'), ('index_count', 'u4'), ('material', 'u4'), ('group', 'u4')])
+
+    # bounding volumes and counts of a loaded model, see compute_bounds
+    bounds_dtype = np.dtype([('min', 'f4', 3), ('max', 'f4', 3), ('center', 'f4', 3), ('radius', 'f4'),
+                             ('vertex_count', 'u4'), ('triangle_count', 'u4')])
 
     @staticmethod
-    def search_data(data_values, coordinates, skip, data_type, scale=1.0):
-        for d in data_values:
-            if d == skip:
-                continue
-            if data_type == 'float':
-                coordinates.append(float(d)*scale)
-            elif data_type == 'int':
-                coordinates.append(int(d)-1)
+    def label_lines(buf):
+        # returns the start, length, keyword label and indentation of every line in a uint8 buffer, the label is
+        # the position of the keyword in ObjLoader.keywords, -1 for anything else, the keyword of a line starts
+        # after its indentation of spaces and tabs
+        starts = np.concatenate(([0], np.flatnonzero(buf == ord('\n')) + 1))
+        starts = starts[starts < len(buf)]
+        lengths = np.diff(np.append(starts, len(buf)))
+
+        def at(offsets):
+            # the bytes at offsets clamped to the last byte of buf, instead of copying buf into a padded one, past
+            # the end that is a byte of the same line, which never turns it into a keyword line
+            return buf[np.minimum(offsets, len(buf) - 1)]
+
+        # one pass per level of the deepest indentation, each only over the lines indented that far
+        indents = np.zeros(len(starts), dtype=np.int64)
+        indented = np.flatnonzero((buf[starts] == ord(' ')) | (buf[starts] == ord('\t')))
+        while len(indented):
+            indents[indented] += 1
+            offsets = starts[indented] + indents[indented]
+            head = at(offsets)
+            indented = indented[((head == ord(' ')) | (head == ord('\t'))) & (offsets < len(buf))]
+
+        heads = starts + indents
+        first, second, third = at(heads), at(heads + 1), at(heads + 2)
+        space = (second == ord(' ')) | (second == ord('\t'))
+        space2 = (third == ord(' ')) | (third == ord('\t'))
+        labels = np.full(len(starts), -1, dtype=np.int8)
+        labels[(first == ord('v')) & space] = 0
+        labels[(first == ord('v')) & (second == ord('t')) & space2] = 1
+        labels[(first == ord('v')) & (second == ord('n')) & space2] = 2
+        labels[(first == ord('f')) & space] = 3
+        return starts, lengths, labels, indents
+
+
+    @staticmethod
+    def split_records(data):
+        # returns {keyword: bytes} holding only the lines starting with that keyword,
+        # the keyword itself is blanked out so every value is a plain list of numbers,
+        # also returns the number of v, vt and vn lines seen before every f line
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, lengths, labels, indents = ObjLoader.label_lines(buf)
+        byte_labels = np.repeat(labels, lengths)
+
+        records = {}
+        for label, keyword in enumerate(ObjLoader.keywords):
+            selected = buf[byte_labels == label]
+            # blank out the keyword at the start of every selected line
+            line_lengths = lengths[labels == label]
+            offsets = np.cumsum(line_lengths) - line_lengths + indents[labels == label]
+            for i in range(len(keyword)):
+                selected[offsets + i] = ord(' ')
+            records[keyword] = selected.tobytes()
+
+        counts_before = np.cumsum(labels[:, None] == np.arange(3), axis=0)[labels == 3]
+        return records, counts_before
+
+
+    @staticmethod
+    def parse_values(records, keyword, width):
+        # returns the (lines, width) table of the keyword's lines in split_records, lines with more values like the
+        # colours after v x y z or the w of vt u v w keep their first width ones, fewer values raise a ValueError
+        record = records[keyword]
+        values = np.fromstring(record, dtype=np.float64, sep=' ')
+        lines = record.count(b'\n') + (len(record) > 0 and not record.endswith(b'\n'))
+        if len(values) == lines * width:
+            return values.reshape(-1, width)
+
+        # count the values of every line, a token starts where a space ends
+        buf = np.frombuffer(record, dtype=np.uint8)
+        space = buf <= ord(' ')
+        token_starts = np.flatnonzero(np.concatenate(([True], space[:-1])) > space)
+        line_ends = np.append(np.flatnonzero(buf == ord('\n')), len(buf))[:lines]
+        counts = np.diff(np.searchsorted(token_starts, line_ends), prepend=0)
+        bad = np.flatnonzero(counts < width)
+        if len(bad) or counts.sum() != len(values):
+            line = bad[0] if len(bad) else np.searchsorted(np.cumsum(counts), len(values), 'right')
+            text = record[line_ends[line - 1] + 1 if line else 0:line_ends[line]].strip().decode(errors='replace')
+            raise ValueError('%s line %r does not hold %d numbers' % (keyword.decode(), text, width))
+        first = np.cumsum(counts) - counts
+        return values[first[:, None] + np.arange(width)]
+
+
+    @staticmethod
+    def parse_faces(faces, counts_before, base=(0, 0, 0)):
+        # parses the f records into one zero based v/vt/vn triple per triangle corner, -1 marks a missing vt or vn,
+        # handles v, v/vt, v//vn and v/vt/vn corners, negative relative indices and fan triangulates n-gons
+        num_faces = len(counts_before)
+        faces = faces.replace(b'//', b'/0/')
+        buf = np.frombuffer(faces, dtype=np.uint8)
+        if len(buf) == 0:
+            return np.empty((0, 3), dtype=np.int64)
+
+        # every whitespace separated token is one face corner, whitespace and control bytes are all <= b' '
+        space = buf <= ord(' ')
+        token_starts = np.flatnonzero(np.concatenate(([True], space[:-1])) > space)
+        line_ends = np.append(np.flatnonzero(buf == ord('\n')), len(buf))[:num_faces]
+        face_corners = np.diff(np.searchsorted(token_starts, line_ends), prepend=0)
+        slashes = np.flatnonzero(buf == ord('/'))
+
+        numbers = np.fromstring(faces.replace(b'/', b' '), dtype=np.int64, sep=' ')
+        if len(slashes) == 2 * len(token_starts) and len(numbers) == 3 * len(token_starts):
+            corners = numbers.reshape(-1, 3)
+        else:
+            # scatter the numbers into a corner table, 0 stands for a missing index
+            per_corner = np.bincount(np.searchsorted(token_starts, slashes, 'right') - 1, minlength=len(token_starts)) + 1
+            corners = np.zeros((len(token_starts), 3), dtype=np.int64)
+            first = np.cumsum(per_corner) - per_corner
+            component = np.arange(len(numbers)) - np.repeat(first, per_corner)
+            corners[np.repeat(np.arange(len(token_starts)), per_corner), component] = numbers
+
+        # positive indices count from the start of the file, negative ones back from the current line
+        if np.any(numbers < 0):
+            before = np.repeat(counts_before + base, face_corners, axis=0)
+            corners = np.where(corners < 0, before + corners, corners - 1)
+        else:
+            corners = corners - 1
+
+        # fan triangulation, corner 0 of a face is shared by all of its triangles
+        arity = face_corners[0]
+        if arity >= 3 and np.all(face_corners == arity):
+            fan = [[0, i, i + 1] for i in range(1, arity - 1)]
+            return corners.reshape(-1, arity, 3)[:, fan].reshape(-1, 3)
+        face_start = np.cumsum(face_corners) - face_corners
+        triangles = np.maximum(face_corners - 2, 0)
+        tri_face = np.repeat(np.arange(len(face_corners)), triangles)
+        tri_local = np.arange(len(tri_face)) - np.repeat(np.cumsum(triangles) - triangles, triangles) + 1
+        fan = np.stack((face_start[tri_face], face_start[tri_face] + tri_local, face_start[tri_face] + tri_local + 1), axis=1)
+        return corners[fan.ravel()]
+
+
+    @staticmethod
+    def parse_obj(data, scale=1.0, base=(0, 0, 0)):
+        # bulk parse the v, vt, vn and f records of an .obj file held in memory,
+        # base holds the v, vt and vn counts of the file before data when only a part of it is parsed
+        records, counts_before = ObjLoader.split_records(data)
+        vertices = ObjLoader.parse_values(records, b'v', 3) * scale
+        textures = ObjLoader.parse_values(records, b'vt', 2)
+        normals = ObjLoader.parse_values(records, b'vn', 3)
+        indices_data = ObjLoader.parse_faces(records[b'f'], counts_before, base)
+
+        return vertices, textures, normals, indices_data
+
+
+    @staticmethod
+    def parse_groups(data):
+        # returns (materials, groups, libraries, triangle_material, triangle_group), the usemtl names, the o and g
+        # names and the mtllib files in the order they first appear, and the material and group of every triangle
+        # parse_obj emits, faces before the first usemtl, o or g statement get the name ''
+        buf = np.frombuffer(data, dtype=np.uint8)
+        starts, lengths, labels, _ = ObjLoader.label_lines(buf)
+        face_starts, face_ends = starts[labels == 3], (starts + lengths)[labels == 3]
+
+        # every f line fans out into one triangle less than it has corners, the keyword is a token too
+        space = buf <= ord(' ')
+        token_starts = np.flatnonzero(np.concatenate(([True], space[:-1])) > space)
+        tokens = np.searchsorted(token_starts, face_ends) - np.searchsorted(token_starts, face_starts)
+        triangles = np.maximum(tokens - 3, 0)
+
+        # a statement without a name like a bare g goes back to '', a g line naming several groups puts its faces
+        # into the first one, the lookahead keeps lines like 'off' from matching o
+        statements = [(m.start(), m.group(1), m.group(2).strip().decode())
+                      for m in re.finditer(rb'^[ \t]*(usemtl|mtllib|o|g)(?![^ \t\r\n])([^\r\n]*)', data, re.M)]
+        statements = [(start, keyword, name.split()[0] if keyword == b'g' and name else name)
+                      for start, keyword, name in statements]
+        libraries = [name for _, keyword, line in statements if keyword == b'mtllib' for name in line.split()]
+
+        def assign(keywords):
+            # the last statement before every face names it
+            found = [(start, name) for start, keyword, name in statements if keyword in keywords]
+            names = list(dict.fromkeys([''] + [name for _, name in found]))
+            positions = np.array([-1] + [start for start, _ in found])
+            ids = np.array([0] + [names.index(name) for _, name in found])
+            face_ids = ids[np.searchsorted(positions, face_starts, 'right') - 1]
+            # drop the names no face uses, keeps the order they first appear in
+            used, face_ids = np.unique(face_ids, return_inverse=True)
+            return [names[i] for i in used], np.repeat(face_ids.ravel(), triangles)
+
+        materials, triangle_material = assign((b'usemtl',))
+        groups, triangle_group = assign((b'o', b'g'))
+        return materials, groups, libraries, triangle_material, triangle_group
+
+
+    @staticmethod
+    def split_ranges(data, count):
+        # cuts data into count byte ranges that start and end on line boundaries
+        bounds = [0]
+        for i in range(1, count):
+            cut = data.find(b'\n', max(len(data) * i // count, bounds[-1])) + 1
+            if cut == 0:
+                break
+            bounds.append(cut)
+        bounds.append(len(data))
+        return [(start, end) for start, end in zip(bounds, bounds[1:]) if end > start]
+
+
+    @staticmethod
+    def parse_range(file, start, end, scale=1.0, base=(0, 0, 0)):
+        # runs in a worker process, parses one line aligned byte range of the file
+        with open(file, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return ObjLoader.parse_obj(data[start:end], scale, base)
+
+
+    @staticmethod
+    def parse_obj_parallel(file, data, workers, scale=1.0):
+        # parses the byte ranges of the file in worker processes and merges them in file order,
+        # every range gets the v, vt and vn counts before it so negative indices resolve globally
+        ranges = ObjLoader.split_ranges(data, workers)
+        bases = [(0, 0, 0)]
+        for start, end in ranges[:-1]:
+            _, _, labels, _ = ObjLoader.label_lines(np.frombuffer(data, dtype=np.uint8, count=end - start, offset=start))
+            bases.append(tuple(np.add(bases[-1], np.bincount(labels + 1, minlength=4)[1:4])))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(ObjLoader.parse_range, file, start, end, scale, base)
+                       for (start, end), base in zip(ranges, bases)]
+            parts = [future.result() for future in futures]
+        return tuple(np.concatenate(arrays) for arrays in zip(*parts))
+
+
+    @staticmethod
+    def generate_normals(vertices, indices_data, crease_angle=180.0, weighting='area'):
+        # returns (normals, indices_data) with new normals and vn indices for every triangle corner, a corner averages
+        # the normals of the triangles around its position that are within crease_angle degrees of its own triangle,
+        # 180 gives fully smooth and 0 flat normals, weighting is 'area' or 'angle' (the corner angle)
+        corners = indices_data[:, 0]
+        p0, p1, p2 = (vertices[corners[i::3]] for i in range(3))
+        face_normals = np.cross(p1 - p0, p2 - p0) # its length is twice the triangle area
+        lengths = np.linalg.norm(face_normals, axis=1)
+        unit = face_normals / np.maximum(lengths, 1e-30)[:, None]
+
+        if weighting == 'area':
+            weighted = np.repeat(face_normals, 3, axis=0)
+        elif weighting == 'angle':
+            edges = [p1 - p0, p2 - p1, p0 - p2]
+            angles = np.empty((len(p0), 3))
+            for i in range(3):
+                a, b = edges[i], -edges[i - 1]
+                cos = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-30)
+                angles[:, i] = np.arccos(np.clip(cos, -1.0, 1.0))
+            weighted = np.repeat(unit, 3, axis=0) * angles.reshape(-1, 1)
+        else:
+            raise ValueError('unknown normal weighting %r' % weighting)
+
+        indices_data = indices_data.copy()
+        if crease_angle >= 180.0:
+            # smooth, one normal per position accumulated with a scatter add
+            sums = np.column_stack([np.bincount(corners, weighted[:, i], len(vertices)) for i in range(3)])
+            normals = sums / np.maximum(np.linalg.norm(sums, axis=1), 1e-30)[:, None]
+            indices_data[:, 2] = corners
+            return normals, indices_data
+
+        # the corners of every position split into at most crease_clusters clusters, the first corner left on a
+        # position seeds the next cluster and takes the corners within half the crease angle of its face, corners
+        # still left after the last cluster join the one whose seed is closest, each pass only touches the corners
+        # left, so the cost grows with the corners times the clusters instead of with the square of the valence
+        order = np.argsort(corners, kind='stable')
+        face_unit = np.repeat(unit, 3, axis=0)
+        cosine = np.cos(np.radians(crease_angle)) - 1e-6
+        half_cosine = np.cos(np.radians(crease_angle / 2)) - 1e-6
+        cluster = np.zeros(len(corners), dtype=np.int64)
+        seeds = [] # (positions, seed corners) of every pass, positions ascending
+        pending = order if crease_angle > 0 else order[:0] # flat normals need no clusters
+        for k in range(ObjLoader.crease_clusters):
+            if not len(pending):
+                break
+            positions = corners[pending]
+            head = np.concatenate(([True], positions[1:] != positions[:-1]))
+            seed = pending[head][np.cumsum(head) - 1]
+            join = (np.einsum('ij,ij->i', face_unit[pending], face_unit[seed]) >= half_cosine) | (pending == seed)
+            cluster[pending[join]] = k
+            seeds.append((positions[head], pending[head]))
+            pending = pending[~join]
+        if len(pending):
+            best = np.full(len(pending), -np.inf)
+            for k, (positions, seed) in enumerate(seeds):
+                slot = np.minimum(np.searchsorted(positions, corners[pending]), len(positions) - 1)
+                dots = np.einsum('ij,ij->i', face_unit[pending], face_unit[seed[slot]])
+                dots[positions[slot] != corners[pending]] = -np.inf
+                cluster[pending[dots > best]] = k
+                best = np.maximum(best, dots)
+
+        # every corner sums the clusters of its position whose mean normal is within the crease angle of its face,
+        # always including its own
+        if seeds:
+            clusters = len(seeds)
+            cluster_keys, cluster_ids = np.unique(corners * clusters + cluster, return_inverse=True)
+            cluster_ids = cluster_ids.ravel()
+            cluster_sums = np.column_stack([np.bincount(cluster_ids, weighted[:, i], len(cluster_keys))
+                                            for i in range(3)])
+            cluster_unit = cluster_sums / np.maximum(np.linalg.norm(cluster_sums, axis=1), 1e-30)[:, None]
+            sums = np.zeros((len(corners), 3))
+            for k in range(clusters):
+                keys = corners * clusters + k
+                slot = np.minimum(np.searchsorted(cluster_keys, keys), len(cluster_keys) - 1)
+                inside = (cluster_keys[slot] == keys) & \
+                    ((np.einsum('ij,ij->i', face_unit, cluster_unit[slot]) >= cosine) | (cluster == k))
+                sums[inside] += cluster_sums[slot[inside]]
+            sums /= np.maximum(np.linalg.norm(sums, axis=1), 1e-30)[:, None]
+        else:
+            sums = face_unit
+
+        # the corners of one smoothing group weld into one normal, quantized below float32 precision first
+        # because corners on different positions sum their clusters in a different order, the three
+        # quantized components pack into one int64 key
+        quantized = np.round(sums * 1e6).astype(np.int64) + 1000000
+        keys = np.ravel_multi_index(quantized.T, (2000001, 2000001, 2000001))
+        _, first_corner, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        normals = sums[first_corner]
+        indices_data[:, 2] = inverse.ravel()
+        return normals, indices_data
 
 
     @staticmethod # sorted vertex buffer for use with glDrawArrays function
     def create_sorted_vertex_buffer(indices_data, vertices, textures, normals):
-        for i, ind in enumerate(indices_data):
-            if i % 3 == 0: # sort the vertex coordinates
-                start = ind * 3
-                end = start + 3
-                ObjLoader.buffer.extend(vertices[start:end])
-            elif i % 3 == 1: # sort the texture coordinates
-                start = ind * 2
-                end = start + 2
-                ObjLoader.buffer.extend(textures[start:end])
-            elif i % 3 == 2: # sort the normal vectors
-                start = ind * 3
-                end = start + 3
-                ObjLoader.buffer.extend(normals[start:end])
-
-
-    @staticmethod # TODO unsorted vertex buffer for use with glDrawElements function
-    def create_unsorted_vertex_buffer(indices_data, vertices, textures, normals):
-        num_verts = len(vertices) // 3
-
-        for i1 in range(num_verts):
-            start = i1 * 3
-            end = start + 3
-            ObjLoader.buffer.extend(vertices[start:end])
-
-            for i2, data in enumerate(indices_data):
-                if i2 % 3 == 0 and data == i1:
-                    start = indices_data[i2 + 1] * 2
-                    end = start + 2
-                    ObjLoader.buffer.extend(textures[start:end])
-
-                    start = indices_data[i2 + 2] * 3
-                    end = start + 3
-                    ObjLoader.buffer.extend(normals[start:end])
+        # a missing texture or normal index is -1 and picks the zero row appended here
+        textures = np.append(textures, np.zeros((1, 2), dtype=textures.dtype), axis=0)
+        normals = np.append(normals, np.zeros((1, 3), dtype=normals.dtype), axis=0)
 
-                    break
+        buffer = np.empty((len(indices_data), 8), dtype=np.float32)
+        buffer[:, 0:3] = vertices[indices_data[:, 0]] # sort the vertex coordinates
+        buffer[:, 3:5] = textures[indices_data[:, 1]] # sort the texture coordinates
+        buffer[:, 5:8] = normals[indices_data[:, 2]] # sort the normal vectors
+        return buffer.ravel()
+
+
+    @staticmethod # indexed vertex buffer for use with glDrawElements function
+    def create_indexed_vertex_buffer(indices_data, vertices, textures, normals):
+        # weld the face corners sharing the same v/vt/vn triple into a single vertex, a lexsort over the three
+        # columns instead of one packed key, whose range overflows int64 for tables of a few million records,
+        # the sort is stable so first is the earliest corner of every triple
+        corner_order = np.lexsort((indices_data[:, 2], indices_data[:, 1], indices_data[:, 0]))
+        ordered = indices_data[corner_order]
+        new = np.concatenate(([True], np.any(ordered[1:] != ordered[:-1], axis=1))) if len(ordered) else \
+            np.zeros(0, dtype=bool)
+        first = corner_order[new]
+        inverse = np.empty(len(indices_data), dtype=np.int64)
+        inverse[corner_order] = np.cumsum(new) - 1
+
+        # number the welded vertices in the order they are first referenced, keeps the buffer cache friendly
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+
+        index_type = 'uint16' if len(order) <= 65536 else 'uint32'
+        indices = rank[inverse.ravel()].astype(index_type)
+        buffer = ObjLoader.create_sorted_vertex_buffer(indices_data[first[order]], vertices, textures, normals)
+        return indices, buffer
+
+
+    @staticmethod
+    def compute_bounds(indices, buffer, stride=8):
+        # AABB, bounding sphere around the AABB center and the vertex and triangle counts of a loaded model,
+        # the positions are read as a strided view of the interleaved buffer, nothing is copied
+        positions = np.asarray(buffer).reshape(-1, stride)[:, :3]
+        bounds = np.zeros((), dtype=ObjLoader.bounds_dtype)
+        if len(positions):
+            low, high = positions.min(axis=0), positions.max(axis=0)
+            center = (low.astype(np.float64) + high) / 2
+            bounds['min'], bounds['max'], bounds['center'] = low, high, center
+            bounds['radius'] = np.sqrt(((positions - center) ** 2).sum(axis=1).max())
+        bounds['vertex_count'] = len(positions)
+        bounds['triangle_count'] = len(indices) // 3
+        return bounds
 
 
     @staticmethod
@@ -63,44 +403,349 @@ class ObjLoader:
 
 
     @staticmethod
-    def load_model(file, sorted=True, scale=1.0):
-        vert_coords = [] # will contain all the vertex coordinates
-        tex_coords = [] # will contain all the texture coordinates
-        norm_coords = [] # will contain all the vertex normals
+    def load_model(file, sorted=True, scale=1.0, workers=1, optimize=False, crease_angle=None, normal_weighting='area',
+                   bounds=False, structured=False, data=None):
+        # workers > 1 parses the file in that many processes, only worth it for very large files,
+        # optimize=True reorders indexed meshes for the vertex cache, optimize='overdraw' also sorts triangle
+        # clusters to reduce overdraw, the result is cached like any other load,
+        # normals are generated with crease_angle when it is given or when the file has no vn records,
+        # bounds=True returns (indices, buffer, bounds) with a bounds_dtype record, see compute_bounds,
+        # structured=True returns (indices, vertices, data) instead of (indices, buffer), see as_structured,
+        # data are the bytes of file when the caller already read them
+        if data is None:
+            with open(file, 'rb') as f:
+                data = f.read() if workers == 1 else mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
 
-        all_indices = [] # will contain all the vertex, texture and normal indices
-        indices = [] # will contain the indices for indexed drawing
+        cache = ObjLoader.cache
+        if cache is not None:
+            key = MeshCache.make_key(file, data, sorted, scale, optimize, crease_angle, normal_weighting,
+                                     ObjLoader.crease_angle, ObjLoader.crease_clusters)
+            names = ('indices', 'buffer', 'bounds') if bounds else ('indices', 'buffer')
+            cached = cache.load(key, names)
+            if cached is not None:
+                return ObjLoader.as_structured(cached) if structured else tuple(cached)
 
+        if workers == 1:
+            vertices, textures, normals, indices_data = ObjLoader.parse_obj(data, scale)
+        else:
+            vertices, textures, normals, indices_data = ObjLoader.parse_obj_parallel(file, data, workers, scale)
 
-        with open(file, 'r') as f:
-            line = f.readline()
-            while line:
-                values = line.split()
-                if values[0] == 'v':
-                    ObjLoader.search_data(values, vert_coords, 'v', 'float', scale)
-                elif values[0] == 'vt':
-                    ObjLoader.search_data(values, tex_coords, 'vt', 'float')
-                elif values[0] == 'vn':
-                    ObjLoader.search_data(values, norm_coords, 'vn', 'float')
-                elif values[0] == 'f':
-                    for value in values[1:]:
-                        val = value.split('/')
-                        ObjLoader.search_data(val, all_indices, 'f', 'int')
-                        indices.append(int(val[0])-1)
-
-                line = f.readline()
+        if crease_angle is not None or len(normals) == 0:
+            angle = ObjLoader.crease_angle if crease_angle is None else crease_angle
+            normals, indices_data = ObjLoader.generate_normals(vertices, indices_data, angle, normal_weighting)
 
         if sorted:
             # use with glDrawArrays
-            ObjLoader.create_sorted_vertex_buffer(all_indices, vert_coords, tex_coords, norm_coords)
+            indices = indices_data[:, 0].astype('uint32')
+            buffer = ObjLoader.create_sorted_vertex_buffer(indices_data, vertices, textures, normals)
         else:
-            # use with glDrawElements
-            ObjLoader.create_unsorted_vertex_buffer(all_indices, vert_coords, tex_coords, norm_coords)
+            # use with glDrawElements, the indices are uint16 whenever the vertex count allows it
+            indices, buffer = ObjLoader.create_indexed_vertex_buffer(indices_data, vertices, textures, normals)
+            if optimize:
+                indices, buffer = MeshOptimizer.optimize(indices, buffer, overdraw=optimize == 'overdraw')
+
+        # ObjLoader.show_buffer_data(buffer)
+
+        result = (indices, buffer, ObjLoader.compute_bounds(indices, buffer)) if bounds else (indices, buffer)
+        if cache is not None:
+            cache.store(key, names, result)
+
+        return ObjLoader.as_structured(result) if structured else result
+
+
+    @staticmethod
+    def as_structured(result):
+        # swaps the flat float32 buffer of a load_model result for a VertexFormat.float_dtype view of the same memory
+        # and a memoryview of its bytes for glBufferData, field views like vertices['position'] copy nothing either
+        indices, buffer = result[:2]
+        vertices = buffer.view(VertexFormat.float_dtype)
+        return (indices, vertices, memoryview(vertices).cast('B')) + tuple(result[2:])
+
+
+    @staticmethod
+    def load_cached(file, options, names, build):
+        # reads file once and returns the arrays named names from the cache entry of its content and options, or
+        # on a miss the list build(data) returns for the bytes read, which is stored under that entry, the class
+        # settings that change the normals are part of the key too
+        with open(file, 'rb') as f:
+            data = f.read()
+        cache = ObjLoader.cache
+        if cache is None:
+            return build(data)
+        key = MeshCache.make_key(file, data, ObjLoader.crease_angle, ObjLoader.crease_clusters, *options)
+        cached = cache.load(key, names)
+        if cached is None:
+            cached = build(data)
+            cache.store(key, names, cached)
+        return cached
+
+
+    @staticmethod
+    def load_compact(file, scale=1.0, optimize=True, uv_format='half'):
+        # returns (indices, vertices, decode) with the VertexFormat.compact_dtype vertices, set the VAO up with
+        # VertexFormat.setup_attributes(vertices.dtype) and draw with pyrr.matrix44.multiply(decode, model)
+        def build(data):
+            indices, buffer = ObjLoader.load_model(file, False, scale, optimize=optimize, data=data)
+            return [indices] + list(VertexFormat.quantize(buffer, uv_format=uv_format))
+
+        return tuple(ObjLoader.load_cached(file, ('compact', scale, optimize, uv_format),
+                                           ('indices', 'vertices', 'decode'), build))
+
+
+    @staticmethod
+    def load_lod_chain(file, ratios=(1.0, 0.5, 0.25, 0.1), scale=1.0, target_error=0.05):
+        # returns ([index buffer per level], vertex buffer), every level keeps about ratio of the triangles
+        # and indexes into the one vertex buffer, the chain is cached next to the plain loads
+        def build(data):
+            indices, buffer = ObjLoader.load_model(file, False, scale, optimize=True, data=data)
+            return [buffer] + [MeshOptimizer.optimize_vertex_cache(lod, len(buffer) // 8)
+                               for lod in MeshOptimizer.lod_chain(indices, buffer, ratios, target_error)]
+
+        names = ('buffer',) + tuple('lod%d' % i for i in range(len(ratios)))
+        arrays = ObjLoader.load_cached(file, ('lod', tuple(ratios), scale, target_error), names, build)
+        return arrays[1:], arrays[0]
+
+
+    @staticmethod
+    def load_meshlets(file, max_vertices=64, max_triangles=124, scale=1.0):
+        # returns (index buffer, vertex buffer, meshlets), the triangles of every meshlet are contiguous in the
+        # index buffer, see MeshOptimizer.meshlet_dtype for the per cluster draw range and culling bounds
+        def build(data):
+            indices, buffer = ObjLoader.load_model(file, False, scale, optimize=True, data=data)
+            indices, meshlets = MeshOptimizer.build_meshlets(indices, buffer, max_vertices, max_triangles)
+            return [indices, buffer, meshlets]
+
+        return tuple(ObjLoader.load_cached(file, ('meshlets', max_vertices, max_triangles, scale),
+                                           ('indices', 'buffer', 'meshlets'), build))
+
+
+    @staticmethod
+    def load_materials(file):
+        # returns {name: {statement: value}} for the newmtl blocks of an .mtl file, numeric statements become floats
+        # like Ns or float tuples like Kd, map_* statements the path of the texture relative to the .mtl file
+        materials = {}
+        current = None
+        with open(file, 'r') as f:
+            for line in f:
+                values = line.split()
+                if not values or values[0].startswith('#'):
+                    continue
+                if values[0] == 'newmtl':
+                    current = materials.setdefault(' '.join(values[1:]), {})
+                elif current is not None and (values[0].startswith('map_') or values[0] in ('bump', 'disp', 'decal')):
+                    # texture options like -s 1 1 1 come before the file name
+                    current[values[0]] = os.path.join(os.path.dirname(file), values[-1])
+                elif current is not None:
+                    try:
+                        numbers = tuple(float(d) for d in values[1:])
+                        current[values[0]] = numbers[0] if len(numbers) == 1 else numbers
+                    except ValueError:
+                        current[values[0]] = ' '.join(values[1:])
+        return materials
+
+
+    @staticmethod
+    def load_submeshes(file, scale=1.0, optimize=True):
+        # returns (indices, buffer, ranges, materials, groups), one vertex and index buffer for the whole model,
+        # the triangles sorted by material and then by group, one range_dtype draw range per material and group,
+        # materials holds a {'name': ..., statement: value} dict per material with the statements of the mtllib files,
+        # groups the o and g names, draw_ranges merges the ranges into the fewest draws
+        def build(data):
+            vertices, textures, normals, indices_data = ObjLoader.parse_obj(data, scale)
+            if len(normals) == 0:
+                normals, indices_data = ObjLoader.generate_normals(vertices, indices_data, ObjLoader.crease_angle)
+            material_names, groups, libraries, triangle_material, triangle_group = ObjLoader.parse_groups(data)
 
-        # ObjLoader.show_buffer_data(ObjLoader.buffer)
+            # sort the triangles by material and then by group, the order inside a group is kept
+            order = np.lexsort((triangle_group, triangle_material))
+            indices_data = indices_data.reshape(-1, 3, 3)[order].reshape(-1, 3)
+            part = triangle_material[order].astype(np.int64) * max(len(groups), 1) + triangle_group[order]
+            bounds = np.concatenate(([0], np.flatnonzero(np.diff(part)) + 1, [len(part)]))
 
-        buffer = ObjLoader.buffer.copy() # create a local copy of the buffer list, otherwise it will overwrite the static field buffer
-        ObjLoader.buffer = [] # after copy, make sure to set it back to an empty list
+            ranges = np.zeros(len(bounds) - 1, dtype=ObjLoader.range_dtype)
+            ranges['index_offset'] = bounds[:-1] * 3
+            ranges['index_count'] = np.diff(bounds) * 3
+            ranges['material'] = triangle_material[order][bounds[:-1]]
+            ranges['group'] = triangle_group[order][bounds[:-1]]
 
-        return np.array(indices, dtype='uint32'), np.array(buffer, dtype='float32')
+            indices, buffer = ObjLoader.create_indexed_vertex_buffer(indices_data, vertices, textures, normals)
+            if optimize:
+                # the vertex cache pass only reorders inside a range, the fetch pass renumbers the shared buffer
+                indices = np.concatenate([MeshOptimizer.optimize_vertex_cache(indices[start:start + count],
+                                                                              len(buffer) // 8)
+                                          for start, count in zip(ranges['index_offset'], ranges['index_count'])] +
+                                         [indices[:0]]).astype(indices.dtype)
+                indices, buffer = MeshOptimizer.optimize_vertex_fetch(indices, buffer)
+
+            return [indices, buffer, ranges] + [np.array(values, dtype=str)
+                                                for values in (material_names, groups, libraries)]
+
+        names = ('indices', 'buffer', 'ranges', 'materials', 'groups', 'libraries')
+        indices, buffer, ranges, material_names, groups, libraries = \
+            ObjLoader.load_cached(file, ('submeshes', scale, optimize), names, build)
+        material_names, groups, libraries = material_names.tolist(), groups.tolist(), libraries.tolist()
+
+        # the mtl files are small and read on every load so material edits show up without invalidating the cache
+        statements = {}
+        for library in libraries:
+            path = os.path.join(os.path.dirname(file), library)
+            if os.path.isfile(path):
+                statements.update(ObjLoader.load_materials(path))
+        materials = [dict(statements.get(name, {}), name=name) for name in material_names]
+        return indices, buffer, ranges, materials, groups
+
+
+    @staticmethod
+    def draw_ranges(ranges, hidden_groups=()):
+        # returns [(material, index_offset, index_count)] for the ranges whose group is not hidden, neighboring
+        # ranges of one material merge into a single draw, bind the material once per entry and draw with
+        # glDrawElements(GL_TRIANGLES, index_count, index_type, ctypes.c_void_p(index_offset * indices.itemsize))
+        draws = []
+        for offset, count, material, group in ranges.tolist():
+            if group in hidden_groups:
+                continue
+            if draws and draws[-1][0] == material and draws[-1][1] + draws[-1][2] == offset:
+                draws[-1][2] += count
+            else:
+                draws.append([material, offset, count])
+        return [tuple(draw) for draw in draws]
+
+
+    @staticmethod
+    def load_many(files, sorted=True, scale=1.0, optimize=False, max_workers=None):
+        # loads the files concurrently in a thread pool, returns one future per file in the same order
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = [executor.submit(ObjLoader.load_model, file, sorted, scale, optimize=optimize) for file in files]
+        executor.shutdown(wait=False) # the pool exits by itself once the queued loads are done
+        return futures
+
+
+    @staticmethod
+    def read_chunks(file, chunk_size):
+        # yields memoryviews of blocks of about chunk_size bytes, every block ends on a line boundary, the partial
+        # line after the last newline is read again with the next block instead of being copied over to it
+        with open(file, 'rb') as f:
+            while True:
+                data = f.read(chunk_size)
+                if not data:
+                    break
+                cut = data.rfind(b'\n') + 1
+                while not cut:
+                    # a line longer than chunk_size, read on until it ends
+                    more = f.read(chunk_size)
+                    if not more:
+                        cut = len(data)
+                        break
+                    data += more
+                    cut = data.rfind(b'\n') + 1
+                f.seek(cut - len(data), os.SEEK_CUR)
+                yield memoryview(data)[:cut]
+
+
+    @staticmethod
+    def scan(file, chunk_size=1 << 20):
+        # one pass over the bytes without parsing a number, returns {'v', 'vt', 'vn', 'f', 'corners', 'triangles',
+        # 'arity', 'bytes', 'estimates', 'typical'}, the record counts, the f corners and the triangles they fan out
+        # to, arity maps corners per face to the number of such faces, estimates holds upper bounds on the bytes of
+        # the parse tables and of the 'sorted', 'indexed' and 'compact' results for memory budgets, the indexed ones
+        # assume no corner welds, typical holds the indexed ones for as many welded vertices as the largest of the
+        # v, vt and vn tables, which is exact for the usual exports but no bound
+        counts = np.zeros(4, dtype=np.int64)
+        arity = np.zeros(0, dtype=np.int64)
+        size = 0
+        for data in ObjLoader.read_chunks(file, chunk_size):
+            buf = np.frombuffer(data, dtype=np.uint8)
+            size += len(buf)
+            starts, lengths, labels, indents = ObjLoader.label_lines(buf)
+            counts += np.bincount(labels + 1, minlength=5)[1:]
+            faces = np.flatnonzero(labels == 3)
+            if not len(faces):
+                continue
+
+            # the tokens of an f line are the keyword plus one per corner, a token starts where a space ends, only
+            # the bytes from the first to the last f line are looked at
+            low, high = starts[faces[0]], starts[faces[-1]] + lengths[faces[-1]]
+            span = buf[low:high]
+            # token_start[i] marks a token at i + 1, the tokens of a line starting at s are summed from s - 1 on
+            token_start = (span[:-1] <= ord(' ')) & (span[1:] > ord(' '))
+            line_starts = np.maximum(starts[faces[0]:faces[-1] + 1] - low - 1, 0)
+            tokens = np.add.reduceat(token_start, line_starts, dtype=np.int32)[faces - faces[0]]
+            # the keyword of the span's unindented first line has no space before it
+            corners = tokens - 1
+            corners[0] += indents[faces[0]] == 0
+            arity = np.pad(arity, (0, max(corners.max(initial=0) + 1 - len(arity), 0)))
+            arity[:corners.max(initial=0) + 1] += np.bincount(corners, minlength=1)
+
+        v, vt, vn, f = (int(count) for count in counts)
+        corners = int(arity @ np.arange(len(arity)))
+        triangles = int(arity[3:] @ (np.arange(3, len(arity)) - 2)) if len(arity) > 3 else 0
+        def indexed(vertices):
+            index_size = 2 if vertices <= 65536 else 4
+            return {'indexed': triangles * 3 * index_size + vertices * VertexFormat.float_dtype.itemsize,
+                    'compact': triangles * 3 * index_size + vertices * VertexFormat.compact_dtype.itemsize}
+
+        estimates = {'parse': size + (3 * v + 2 * vt + 3 * vn) * 8 + triangles * 9 * 8,
+                     'sorted': triangles * 3 * VertexFormat.float_dtype.itemsize}
+        estimates.update(indexed(corners))
+        return {'v': v, 'vt': vt, 'vn': vn, 'f': f, 'corners': corners, 'triangles': triangles,
+                'arity': {n: int(count) for n, count in enumerate(arity) if count}, 'bytes': size,
+                'estimates': estimates, 'typical': indexed(min(max(v, vt, vn), corners))}
+
+
+    @staticmethod
+    def append_rows(pool, count, rows):
+        # appends rows to a preallocated pool, doubling its capacity when it runs full, which only happens when
+        # the file grew after it was scanned
+        if count + len(rows) > len(pool):
+            grown = np.empty((max(2 * len(pool), count + len(rows)), pool.shape[1]), dtype=pool.dtype)
+            grown[:count] = pool[:count]
+            pool = grown
+        pool[count:count + len(rows)] = rows
+        return pool, count + len(rows)
+
+
+    @staticmethod
+    def stream_model(file, chunk_size=1 << 20, scale=1.0, scan=None):
+        # yields (byte offset, float32 block) pairs of the sorted glDrawArrays buffer while the file is read,
+        # only the vertex, texture and normal tables stay in memory, the face data never exceeds one chunk,
+        # the tables are allocated at their final size from the counts of scan, which is run when not given,
+        # corners without a vn get the flat normal of their triangle, smoothing them needs the whole mesh
+        scan = ObjLoader.scan(file, chunk_size) if scan is None else scan
+        vertices = np.empty((scan['v'], 3), dtype=np.float32)
+        textures = np.empty((scan['vt'], 2), dtype=np.float32)
+        normals = np.empty((scan['vn'], 3), dtype=np.float32)
+        num_vertices = num_textures = num_normals = 0
+        offset = 0
+
+        for data in ObjLoader.read_chunks(file, chunk_size):
+            v, vt, vn, indices_data = ObjLoader.parse_obj(data, scale, (num_vertices, num_textures, num_normals))
+            vertices, num_vertices = ObjLoader.append_rows(vertices, num_vertices, v)
+            textures, num_textures = ObjLoader.append_rows(textures, num_textures, vt)
+            normals, num_normals = ObjLoader.append_rows(normals, num_normals, vn)
+
+            if len(indices_data):
+                block = ObjLoader.create_sorted_vertex_buffer(indices_data, vertices[:num_vertices],
+                                                              textures[:num_textures], normals[:num_normals])
+                missing = indices_data[:, 2] < 0
+                if missing.any():
+                    rows = block.reshape(-1, 8)
+                    p0, p1, p2 = (rows[i::3, 0:3] for i in range(3))
+                    flat = np.cross(p1 - p0, p2 - p0)
+                    flat /= np.maximum(np.linalg.norm(flat, axis=1), 1e-30)[:, None]
+                    rows[missing, 5:8] = np.repeat(flat, 3, axis=0)[missing]
+                yield offset, block
+                offset += block.nbytes
+
+
+    @staticmethod
+    def upload_stream(file, vbo, chunk_size=1 << 20, scale=1.0):
+        # streams an .obj straight into vbo with glBufferSubData, returns the vertex count for glDrawArrays
+        from OpenGL.GL import glBindBuffer, glBufferData, glBufferSubData, GL_ARRAY_BUFFER, GL_STATIC_DRAW
+        scan = ObjLoader.scan(file, chunk_size)
+        num_corners = scan['triangles'] * 3
 
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, scan['estimates']['sorted'], None, GL_STATIC_DRAW)
+        for offset, block in ObjLoader.stream_model(file, chunk_size, scale, scan):
+            glBufferSubData(GL_ARRAY_BUFFER, offset, block.nbytes, block)
+        return num_corners
@@ -1,12 +1,42 @@
-from OpenGL.GL import glBindTexture, glTexParameteri, GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, \
-    GL_TEXTURE_WRAP_T, GL_REPEAT, GL_TEXTURE_MIN_FILTER, GL_TEXTURE_MAG_FILTER, GL_LINEAR,\
-    glTexImage2D, GL_RGBA, GL_UNSIGNED_BYTE
-
+import io
+import os
+import numpy as np
 from PIL import Image
 
+from MeshCache import MeshCache
 
-# for use with GLFW
-def load_texture(path, texture):
+# decoded, flipped and converted pixels are cached on disk next to this file, set to None to always decode
+cache = MeshCache(os.path.join(os.path.dirname(os.path.abspath(__file__)), '.texture_cache'))
+
+
+# decodes an image into (width, height, RGBA pixels), bottom row first, needs no GL context, the pixels are a
+# writeable flat uint8 array, copy on write memory-mapped from the texture cache on a hit, or the RGBA bytes when
+# the cache is off
+def decode_texture(path):
+    with open(path, 'rb') as f:
+        data = f.read()
+    if cache is not None:
+        key = MeshCache.make_key(path, data, 'RGBA', 'FLIP_TOP_BOTTOM')
+        cached = cache.load(key, ('pixels',))
+        if cached is not None:
+            height, width = cached[0].shape[:2]
+            return width, height, cached[0].reshape(-1)
+
+    image = Image.open(io.BytesIO(data))
+    image = image.transpose(Image.FLIP_TOP_BOTTOM)
+    if cache is None:
+        return image.width, image.height, image.convert("RGBA").tobytes()
+    pixels = np.array(image.convert("RGBA"), dtype=np.uint8)
+    cache.store(key, ('pixels',), [pixels])
+    return image.width, image.height, pixels.reshape(-1)
+
+
+# img_data None only allocates the texture, the rows can follow with glTexSubImage2D,
+# OpenGL is imported here so decode_texture also works on machines without a GL library
+def upload_texture(texture, width, height, img_data):
+    from OpenGL.GL import glBindTexture, glTexParameteri, GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, \
+        GL_TEXTURE_WRAP_T, GL_REPEAT, GL_TEXTURE_MIN_FILTER, GL_TEXTURE_MAG_FILTER, GL_LINEAR,\
+        glTexImage2D, GL_RGBA, GL_UNSIGNED_BYTE
     glBindTexture(GL_TEXTURE_2D, texture)
     # Set the texture wrapping parameters
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
@@ -14,28 +44,21 @@ def load_texture(path, texture):
     # Set texture filtering parameters
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
     glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-    # load image
-    image = Image.open(path)
-    image = image.transpose(Image.FLIP_TOP_BOTTOM)
-    img_data = image.convert("RGBA").tobytes()
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image.width, image.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
     return texture
 
 
+# for use with GLFW
+def load_texture(path, texture):
+    return upload_texture(texture, *decode_texture(path))
+
+
 # for use with pygame
 def load_texture_pygame(path, texture):
     import pygame
-    glBindTexture(GL_TEXTURE_2D, texture)
-    # Set the texture wrapping parameters
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-    # Set texture filtering parameters
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
     # load image
     image = pygame.image.load(path)
     image = pygame.transform.flip(image, False, True)
     image_width, image_height = image.get_rect().size
     img_data = pygame.image.tostring(image, "RGBA")
-    glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image_width, image_height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-    return texture
\ No newline at end of file
+    return upload_texture(texture, image_width, image_height, img_data)
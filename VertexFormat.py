@@ -0,0 +1,118 @@
+import ctypes
+import numpy as np
+
+
+# compact vertex layouts for the 8 float (position, uv, normal) buffers of ObjLoader, a vertex format is a numpy
+# structured dtype, VertexFormat.layout turns its fields into the matching glVertexAttribPointer arguments
+class VertexFormat:
+    # the attribute locations the shaders of the episodes use
+    locations = {'position': 0, 'uv': 1, 'normal': 2}
+
+    # the layout ObjLoader.load_model emits, 32 bytes per vertex
+    float_dtype = np.dtype([('position', '<f4', 3), ('uv', '<f4', 2), ('normal', '<f4', 3)])
+
+    # unorm16 positions inside the mesh bounds (w is always 1), octahedral snorm16 normals and half float uvs,
+    # 16 bytes per vertex, 'uv' is unorm16 instead of half when quantize is called with uv_format='unorm16'
+    compact_dtype = np.dtype([('position', '<u2', 4), ('normal', '<i2', 2), ('uv', '<f2', 2)])
+
+    gl_types = {'f4': 'GL_FLOAT', 'f2': 'GL_HALF_FLOAT', 'u2': 'GL_UNSIGNED_SHORT', 'i2': 'GL_SHORT',
+                'u1': 'GL_UNSIGNED_BYTE', 'i1': 'GL_BYTE'}
+
+    # decodes the 'normal' attribute of compact_dtype in a vertex shader, a_normal = oct_decode(a_normal_oct)
+    octahedral_glsl = """
+vec3 oct_decode(vec2 e)
+{
+    vec3 n = vec3(e, 1.0 - abs(e.x) - abs(e.y));
+    float t = max(-n.z, 0.0);
+    n.xy += vec2(n.x >= 0.0 ? -t : t, n.y >= 0.0 ? -t : t);
+    return normalize(n);
+}
+"""
+
+    @staticmethod
+    def layout(dtype):
+        # returns [(location, components, GL type name, normalized, byte offset)] for every attribute of dtype,
+        # integer fields are normalized to [0, 1] or [-1, 1] by the GL
+        attributes = []
+        for name, location in sorted(VertexFormat.locations.items(), key=lambda item: item[1]):
+            if name not in dtype.names:
+                continue
+            field, offset = dtype.fields[name][:2]
+            base = field.base
+            gl_type = VertexFormat.gl_types[base.kind + str(base.itemsize)]
+            components = field.shape[0] if field.shape else 1
+            attributes.append((location, components, gl_type, base.kind in 'iu', offset))
+        return attributes
+
+
+    @staticmethod
+    def setup_attributes(dtype):
+        # enables and points every attribute of dtype, the VAO and the VBO have to be bound
+        import OpenGL.GL as gl
+        for location, components, gl_type, normalized, offset in VertexFormat.layout(dtype):
+            gl.glEnableVertexAttribArray(location)
+            gl.glVertexAttribPointer(location, components, getattr(gl, gl_type), gl.GL_TRUE if normalized else gl.GL_FALSE,
+                                     dtype.itemsize, ctypes.c_void_p(offset))
+
+
+    @staticmethod
+    def encode_octahedral(normals):
+        # maps unit normals onto the octahedron and unfolds its lower half, returns snorm16 pairs
+        normals = np.asarray(normals, dtype=np.float64)
+        n = normals / np.maximum(np.abs(normals).sum(axis=1), 1e-30)[:, None]
+        xy = n[:, :2].copy()
+        lower = n[:, 2] < 0
+        xy[lower] = (1.0 - np.abs(n[lower][:, [1, 0]])) * np.where(xy[lower] >= 0, 1.0, -1.0)
+        return np.round(np.clip(xy, -1.0, 1.0) * 32767).astype(np.int16)
+
+
+    @staticmethod
+    def decode_octahedral(encoded):
+        # inverse of encode_octahedral, the same math as octahedral_glsl
+        e = np.maximum(np.asarray(encoded, dtype=np.float64) / 32767, -1.0)
+        n = np.column_stack((e, 1.0 - np.abs(e).sum(axis=1)))
+        t = np.maximum(-n[:, 2], 0.0)
+        n[:, :2] -= np.where(n[:, :2] >= 0, t[:, None], -t[:, None])
+        return n / np.linalg.norm(n, axis=1)[:, None]
+
+
+    @staticmethod
+    def quantize(buffer, stride=8, uv_format='half'):
+        # packs the (position, uv, normal) buffer into compact_dtype vertices, returns (vertices, decode), decode
+        # is the 4x4 row vector matrix that maps the unorm positions back into the mesh bounds, multiply it in
+        # front of the model matrix, pyrr.matrix44.multiply(decode, model)
+        floats = np.asarray(buffer, dtype=np.float32).reshape(-1, stride)
+        positions, uvs, normals = floats[:, :3], floats[:, 3:5], floats[:, 5:8]
+
+        dtype = VertexFormat.compact_dtype
+        if uv_format == 'unorm16':
+            if len(uvs) and (uvs.min() < 0.0 or uvs.max() > 1.0):
+                raise ValueError('unorm16 texture coordinates have to lie in [0, 1], use uv_format=\'half\'')
+            dtype = np.dtype([('position', '<u2', 4), ('normal', '<i2', 2), ('uv', '<u2', 2)])
+        elif uv_format != 'half':
+            raise ValueError('unknown uv format %r' % uv_format)
+
+        low = positions.min(axis=0) if len(positions) else np.zeros(3, dtype=np.float32)
+        extent = (positions.max(axis=0) - low) if len(positions) else np.ones(3, dtype=np.float32)
+        extent = np.where(extent > 0, extent, 1.0) # flat meshes keep one axis at 0
+
+        vertices = np.zeros(len(floats), dtype=dtype)
+        vertices['position'][:, :3] = np.round((positions - low) / extent * 65535)
+        vertices['position'][:, 3] = 65535
+        vertices['normal'] = VertexFormat.encode_octahedral(normals)
+        vertices['uv'] = np.round(uvs * 65535) if uv_format == 'unorm16' else uvs
+
+        decode = np.diag(np.append(extent, 1.0)).astype(np.float32)
+        decode[3, :3] = low
+        return vertices, decode
+
+
+    @staticmethod
+    def dequantize(vertices, decode):
+        # expands compact vertices back into the 8 float buffer layout, used to check the quantization error
+        positions = vertices['position'][:, :3] / 65535 * np.diag(decode)[:3] + decode[3, :3]
+        uvs = vertices['uv'].astype(np.float64)
+        if vertices.dtype['uv'].base.kind == 'u':
+            uvs /= 65535
+        normals = VertexFormat.decode_octahedral(vertices['normal'])
+        return np.column_stack((positions, uvs, normals)).astype(np.float32).ravel()
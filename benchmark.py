@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import zlib
+import time
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+try:
+    import resource
+except ImportError: # not available on Windows
+    resource = None
+
+from ObjLoader import ObjLoader
+from GlbLoader import GlbLoader
+from MeshCache import MeshCache
+from MeshCodec import MeshCodec
+from MeshStore import MeshStore
+from MeshBvh import MeshBvh
+from MeshOptimizer import MeshOptimizer
+from VertexFormat import VertexFormat
+import TextureLoader
+from TextureLoader import decode_texture
+
+MESH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'meshes')
+TEXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'textures')
+
+
+# the original line by line loader, kept as the reference the numpy parser is checked against
+def reference_load_model(file, scale=1.0):
+    vert_coords, tex_coords, norm_coords = [], [], []
+    all_indices, indices, buffer = [], [], []
+
+    with open(file, 'r') as f:
+        for line in f:
+            values = line.split()
+            if values[0] == 'v':
+                vert_coords.extend(float(d)*scale for d in values[1:])
+            elif values[0] == 'vt':
+                tex_coords.extend(float(d) for d in values[1:])
+            elif values[0] == 'vn':
+                norm_coords.extend(float(d) for d in values[1:])
+            elif values[0] == 'f':
+                for value in values[1:]:
+                    val = value.split('/')
+                    all_indices.extend(int(d)-1 for d in val)
+                    indices.append(int(val[0])-1)
+
+    for i in range(0, len(all_indices), 3):
+        v, t, n = all_indices[i:i+3]
+        buffer.extend(vert_coords[v*3:v*3+3])
+        buffer.extend(tex_coords[t*2:t*2+2])
+        buffer.extend(norm_coords[n*3:n*3+3])
+
+    return np.array(indices, dtype='uint32'), np.array(buffer, dtype='float32')
+
+
+def best_time(func, *args, repeat=5):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def mesh_files():
+    return sorted(os.path.join(MESH_DIR, name) for name in os.listdir(MESH_DIR) if name.endswith('.obj'))
+
+
+def texture_files():
+    return sorted(os.path.join(TEXTURE_DIR, name) for name in os.listdir(TEXTURE_DIR)
+                  if name.lower().endswith(('.png', '.jpg', '.jpeg')))
+
+
+def peak_rss_mb():
+    # high water mark of the whole process so far, it never goes down
+    if resource is None:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == 'darwin' else rss / 1024 # bytes on macOS, KB elsewhere
+
+
+def traced_peak_mb(func, *args):
+    # peak of the Python and numpy allocations during one call, run apart from the timing because tracing is slow
+    tracemalloc.start()
+    try:
+        func(*args)
+        return tracemalloc.get_traced_memory()[1] / 1e6
+    finally:
+        tracemalloc.stop()
+
+
+def run_suite(repeat=5):
+    # times the mesh cache free sorted and indexed loads of every mesh and the decode of every texture,
+    # nothing touches GL so the suite runs without a display
+    results = {'environment': {'python': platform.python_version(), 'numpy': np.__version__,
+                               'platform': platform.platform(), 'cpus': os.cpu_count(), 'repeat': repeat},
+               'meshes': [], 'textures': []}
+    cache, ObjLoader.cache = ObjLoader.cache, None
+    try:
+        for path in mesh_files():
+            megabytes = os.path.getsize(path) / 1e6
+            for sorted in (True, False):
+                seconds, (indices, buffer) = best_time(ObjLoader.load_model, path, sorted, repeat=repeat)
+                results['meshes'].append({'file': os.path.basename(path), 'mode': 'sorted' if sorted else 'indexed',
+                                          'seconds': seconds, 'faces': len(indices) // 3,
+                                          'faces_per_second': len(indices) // 3 / seconds,
+                                          'mb_per_second': megabytes / seconds,
+                                          'tracemalloc_peak_mb': traced_peak_mb(ObjLoader.load_model, path, sorted),
+                                          'peak_rss_mb': peak_rss_mb()})
+    finally:
+        ObjLoader.cache = cache
+
+    cache, TextureLoader.cache = TextureLoader.cache, None
+    try:
+        for path in texture_files():
+            seconds, (width, height, _) = best_time(decode_texture, path, repeat=repeat)
+            results['textures'].append({'file': os.path.basename(path), 'seconds': seconds, 'width': width,
+                                        'height': height, 'megapixels_per_second': width * height / 1e6 / seconds,
+                                        'mb_per_second': os.path.getsize(path) / 1e6 / seconds,
+                                        'tracemalloc_peak_mb': traced_peak_mb(decode_texture, path),
+                                        'peak_rss_mb': peak_rss_mb()})
+    finally:
+        TextureLoader.cache = cache
+    return results
+
+
+def print_suite(results):
+    print('%-20s %-8s %10s %12s %10s %10s' % ('mesh', 'mode', 'ms', 'faces/s', 'MB/s', 'traced MB'))
+    for row in results['meshes']:
+        print('%-20s %-8s %10.2f %12.0f %10.1f %10.2f' % (row['file'], row['mode'], row['seconds'] * 1000,
+                                                        row['faces_per_second'], row['mb_per_second'],
+                                                        row['tracemalloc_peak_mb']))
+    print('%-20s %-8s %10s %12s %10s %10s' % ('texture', 'size', 'ms', 'MPixels/s', 'MB/s', 'traced MB'))
+    for row in results['textures']:
+        print('%-20s %-8s %10.2f %12.1f %10.1f %10.2f' % (row['file'], '%dx%d' % (row['width'], row['height']),
+                                                        row['seconds'] * 1000, row['megapixels_per_second'],
+                                                        row['mb_per_second'], row['tracemalloc_peak_mb']))
+
+
+def bench_parser():
+    print('%-20s %12s %12s %9s  %s' % ('mesh', 'reference ms', 'numpy ms', 'speedup', 'identical'))
+    for path in mesh_files():
+        ref_time, (ref_indices, ref_buffer) = best_time(reference_load_model, path, repeat=3)
+        new_time, (indices, buffer) = best_time(ObjLoader.load_model, path)
+        identical = indices.tobytes() == ref_indices.tobytes() and buffer.tobytes() == ref_buffer.tobytes()
+        print('%-20s %12.2f %12.2f %8.1fx  %s' % (os.path.basename(path), ref_time * 1000, new_time * 1000,
+                                                  ref_time / new_time, identical))
+
+
+def bench_scan():
+    # the pre-scan against reading the bytes alone and the typical estimate and upper bound against the real
+    # indexed size
+    print('%-20s %10s %10s %10s %12s %12s %12s' % ('mesh', 'read MB/s', 'scan MB/s', 'triangles', 'typical KB',
+                                                   'bound KB', 'indexed KB'))
+    for path in mesh_files():
+        megabytes = os.path.getsize(path) / 1e6
+        read_time, _ = best_time(lambda: open(path, 'rb').read())
+        scan_time, scan = best_time(ObjLoader.scan, path)
+        indices, buffer = ObjLoader.load_model(path, False)
+        print('%-20s %10.0f %10.0f %10d %12.1f %12.1f %12.1f' % (os.path.basename(path), megabytes / read_time,
+                                                                 megabytes / scan_time, scan['triangles'],
+                                                                 scan['typical']['indexed'] / 1024,
+                                                                 scan['estimates']['indexed'] / 1024,
+                                                                 (indices.nbytes + buffer.nbytes) / 1024))
+
+
+def bench_indexed():
+    # compares the glDrawArrays upload against the welded glDrawElements upload
+    print('%-20s %10s %10s %12s %12s %9s  %s' % ('mesh', 'corners', 'vertices', 'sorted KB', 'indexed KB',
+                                                 'indexed ms', 'matches'))
+    for path in mesh_files():
+        _, sorted_buffer = ObjLoader.load_model(path)
+        index_time, (indices, buffer) = best_time(ObjLoader.load_model, path, False)
+        # expanding the indexed mesh again has to give back the sorted buffer
+        matches = np.array_equal(buffer.reshape(-1, 8)[indices].ravel(), sorted_buffer)
+        print('%-20s %10d %10d %12.1f %12.1f %10.2f  %s' % (os.path.basename(path), len(indices), len(buffer) // 8,
+                                                          sorted_buffer.nbytes / 1024,
+                                                          (buffer.nbytes + indices.nbytes) / 1024,
+                                                          index_time * 1000, matches))
+
+
+def bench_compact():
+    # VBO and index sizes of the 8 float layout against the quantized layout and the largest round trip errors
+    print('%-20s %10s %10s %12s %12s %12s' % ('mesh', 'float KB', 'compact KB', 'position', 'uv', 'normal deg'))
+    for path in mesh_files():
+        indices, buffer = ObjLoader.load_model(path, False)
+        compact_indices, vertices, decode = ObjLoader.load_compact(path, optimize=False)
+        floats, restored = buffer.reshape(-1, 8), VertexFormat.dequantize(vertices, decode).reshape(-1, 8)
+        extent = np.ptp(floats[:, :3], axis=0).max() or 1.0
+        lengths = np.linalg.norm(floats[:, 5:], axis=1)
+        dots = (floats[:, 5:] * restored[:, 5:]).sum(axis=1)[lengths > 0] / lengths[lengths > 0]
+        print('%-20s %10.1f %10.1f %12.2e %12.2e %12.4f' % (os.path.basename(path),
+                                                            (buffer.nbytes + indices.nbytes) / 1024,
+                                                            (vertices.nbytes + compact_indices.nbytes) / 1024,
+                                                            np.abs(restored[:, :3] - floats[:, :3]).max() / extent,
+                                                            np.abs(restored[:, 3:5] - floats[:, 3:5]).max(),
+                                                            np.degrees(np.arccos(np.clip(dots, -1, 1))).max(initial=0)))
+
+
+def bench_normals(names=('chibi.obj', 'monkey_smooth.obj', 'monkey.obj'), crease_angles=(180.0, 60.0, 0.0)):
+    # generated angle weighted normals against the normals stored in the file, median deviation in degrees
+    print('%-20s %8s %10s %10s %10s %10s' % ('mesh', 'crease', 'file vn', 'generated', 'median deg', 'ms'))
+    for name in names:
+        vertices, _, normals, indices_data = ObjLoader.parse_obj(open(os.path.join(MESH_DIR, name), 'rb').read())
+        for crease_angle in crease_angles:
+            seconds, (generated, generated_indices) = best_time(ObjLoader.generate_normals, vertices, indices_data,
+                                                                crease_angle, 'angle', repeat=3)
+            stored, ours = normals[indices_data[:, 2]], generated[generated_indices[:, 2]]
+            dots = (stored * ours).sum(axis=1) / np.linalg.norm(stored, axis=1)
+            print('%-20s %8.0f %10d %10d %10.3f %10.2f' % (name, crease_angle, len(normals), len(generated),
+                                                          np.median(np.degrees(np.arccos(np.clip(dots, -1, 1)))),
+                                                          seconds * 1000))
+
+
+def bench_cache():
+    # parse into an empty cache once, then time the memory-mapped hits
+    print('%-20s %10s %10s' % ('mesh', 'miss ms', 'hit ms'))
+    with tempfile.TemporaryDirectory() as directory:
+        ObjLoader.cache = MeshCache(directory)
+        for path in mesh_files():
+            miss_time, _ = best_time(ObjLoader.load_model, path, repeat=1)
+            hit_time, _ = best_time(ObjLoader.load_model, path)
+            print('%-20s %10.2f %10.2f' % (os.path.basename(path), miss_time * 1000, hit_time * 1000))
+        print(ObjLoader.cache.stats())
+    ObjLoader.cache = None
+
+
+def bench_texture_cache():
+    # decode, flip and convert into an empty cache once, then time the memory-mapped hits
+    print('%-20s %10s %10s' % ('texture', 'miss ms', 'hit ms'))
+    cache = TextureLoader.cache
+    with tempfile.TemporaryDirectory() as directory:
+        TextureLoader.cache = MeshCache(directory)
+        for path in texture_files():
+            miss_time, _ = best_time(decode_texture, path, repeat=1)
+            hit_time, _ = best_time(decode_texture, path)
+            print('%-20s %10.2f %10.2f' % (os.path.basename(path), miss_time * 1000, hit_time * 1000))
+    TextureLoader.cache = cache
+
+
+def bench_codec():
+    # MeshCodec sizes of the cached indexed and compact meshes against their raw bytes and plain zlib,
+    # decode speed in raw MB per second
+    print('%-20s %-8s %10s %10s %10s %10s %12s' % ('mesh', 'format', 'raw KB', 'codec KB', 'ratio', 'zlib ratio',
+                                                   'decode MB/s'))
+    for path in mesh_files():
+        indexed = ObjLoader.load_model(path, False, optimize=True)
+        compact = ObjLoader.load_compact(path)
+        for name, arrays in (('indexed', indexed), ('compact', compact)):
+            raw = sum(array.nbytes for array in arrays)
+            encoded = [MeshCodec.encode(array) for array in arrays]
+            size = sum(len(data) for data in encoded)
+            zlib_size = sum(len(zlib.compress(np.ascontiguousarray(array).tobytes())) for array in arrays)
+            seconds, _ = best_time(lambda: [MeshCodec.decode(data) for data in encoded])
+            print('%-20s %-8s %10.1f %10.1f %9.2fx %9.2fx %12.1f' % (os.path.basename(path), name, raw / 1024,
+                                                                    size / 1024, raw / size, raw / zlib_size,
+                                                                    raw / 1e6 / seconds))
+
+
+def bench_vertex_cache(names=('chibi.obj', 'monkey.obj', 'earth.obj')):
+    # ACMR and ATVR of a 16 entry FIFO cache before and after the vertex cache optimization
+    print('%-20s %10s %10s %10s %10s %10s' % ('mesh', 'ACMR', 'ATVR', 'opt ACMR', 'opt ATVR', 'opt ms'))
+    for name in names:
+        indices, buffer = ObjLoader.load_model(os.path.join(MESH_DIR, name), False)
+        seconds, (opt_indices, opt_buffer) = best_time(MeshOptimizer.optimize, indices, buffer, repeat=1)
+        before = MeshOptimizer.analyze_vertex_cache(indices, len(buffer) // 8)
+        after = MeshOptimizer.analyze_vertex_cache(opt_indices, len(opt_buffer) // 8)
+        print('%-20s %10.3f %10.3f %10.3f %10.3f %10.1f' % ((name,) + before + after + (seconds * 1000,)))
+
+
+def bench_overdraw(names=('chibi.obj', 'monkey_smooth.obj', 'earth.obj', 'cube.obj')):
+    # software overdraw from the six axis directions, unoptimized, vertex cache only and with the overdraw pass
+    print('%-20s %10s %10s %10s %10s' % ('mesh', 'original', 'cache', 'overdraw', 'ACMR'))
+    for name in names:
+        indices, buffer = ObjLoader.load_model(os.path.join(MESH_DIR, name), False)
+        cache_indices, cache_buffer = MeshOptimizer.optimize(indices, buffer)
+        overdraw_indices, overdraw_buffer = MeshOptimizer.optimize(indices, buffer, overdraw=True)
+        print('%-20s %10.3f %10.3f %10.3f %10.3f' % (name, MeshOptimizer.analyze_overdraw(indices, buffer),
+                                                     MeshOptimizer.analyze_overdraw(cache_indices, cache_buffer),
+                                                     MeshOptimizer.analyze_overdraw(overdraw_indices, overdraw_buffer),
+                                                     MeshOptimizer.analyze_vertex_cache(overdraw_indices)[0]))
+
+
+def bench_lod(names=('chibi.obj', 'earth.obj', 'monkey_smooth.obj'), ratios=(1.0, 0.5, 0.25, 0.1)):
+    # triangle counts of every level of the quadric simplification chain
+    print('%-20s %s %10s' % ('mesh', ' '.join('%8d%%' % (ratio * 100) for ratio in ratios), 'ms'))
+    for name in names:
+        indices, buffer = ObjLoader.load_model(os.path.join(MESH_DIR, name), False)
+        seconds, lods = best_time(MeshOptimizer.lod_chain, indices, buffer, ratios, repeat=1)
+        print('%-20s %s %10.1f' % (name, ' '.join('%9d' % (len(lod) // 3) for lod in lods), seconds * 1000))
+
+
+def bench_meshlets(names=('chibi.obj', 'monkey_smooth.obj', 'earth.obj'), views=200):
+    # clusters culled by their normal cone, averaged over random cameras around the mesh
+    print('%-20s %10s %10s %10s %10s' % ('mesh', 'meshlets', 'vertices', 'culled', 'ms'))
+    rng = np.random.default_rng(0)
+    for name in names:
+        seconds, (indices, buffer, meshlets) = best_time(ObjLoader.load_meshlets, os.path.join(MESH_DIR, name),
+                                                         repeat=1)
+        positions = buffer.reshape(-1, 8)[:, :3]
+        center = (positions.min(axis=0) + positions.max(axis=0)) / 2
+        radius = np.linalg.norm(positions - center, axis=1).max()
+        directions = rng.normal(size=(views, 3))
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        culled = np.mean([1.0 - MeshOptimizer.cull_meshlets(meshlets, center + direction * radius * 3).mean()
+                          for direction in directions])
+        print('%-20s %10d %10.1f %9.1f%% %10.1f' % (name, len(meshlets), meshlets['vertex_count'].mean(),
+                                                   culled * 100, seconds * 1000))
+
+
+def bench_dedup(names=('cube.obj', 'cube.obj', 'monkey.obj', 'monkey_smooth.obj', 'chibi.obj')):
+    # a scene loading some meshes twice plus the LOD chain of chibi, whose levels all share one vertex buffer
+    store = MeshStore()
+    handles = [store.load(os.path.join(MESH_DIR, name), sorted=False) for name in names]
+    lods, buffer = ObjLoader.load_lod_chain(os.path.join(MESH_DIR, 'chibi.obj'))
+    handles += [store.add(lod, buffer) for lod in lods]
+    stats = store.stats()
+    print('%d references to %d meshes in %d arrays, %.1f KB stored, %.1f KB requested, %.1f KB saved' %
+          (stats['references'], stats['meshes'], stats['arrays'], stats['bytes'] / 1024,
+           stats['requested_bytes'] / 1024, stats['saved_bytes'] / 1024))
+
+
+def bench_glb():
+    # every mesh exported as .glb once, then the binary load against parsing the .obj into the same indexed mesh
+    print('%-20s %10s %10s %10s %9s  %s' % ('mesh', 'glb KB', 'obj ms', 'glb ms', 'speedup', 'matches'))
+    with tempfile.TemporaryDirectory() as directory:
+        for path in mesh_files():
+            glb = os.path.join(directory, os.path.splitext(os.path.basename(path))[0] + '.glb')
+            GlbLoader.convert_obj(path, glb, optimize=False)
+            obj_time, (indices, buffer) = best_time(ObjLoader.load_model, path, False)
+            glb_time, (glb_indices, glb_buffer) = best_time(GlbLoader.load_model, glb)
+            matches = np.array_equal(glb_indices, indices) and np.allclose(glb_buffer, buffer, atol=1e-6)
+            print('%-20s %10.1f %10.2f %10.2f %8.1fx  %s' % (os.path.basename(path), os.path.getsize(glb) / 1024,
+                                                            obj_time * 1000, glb_time * 1000, obj_time / glb_time,
+                                                            matches))
+
+
+def bench_bvh(rays=20000):
+    # BVH build time and closest hit rays per second, rays from a sphere around the mesh aimed into its bounds
+    print('%-20s %10s %10s %10s %12s %8s' % ('mesh', 'triangles', 'nodes', 'build ms', 'rays/s', 'hits'))
+    rng = np.random.default_rng(0)
+    for path in mesh_files():
+        indices, buffer = ObjLoader.load_model(path, False)
+        build_time, bvh = best_time(MeshBvh, indices, buffer, repeat=3)
+        positions = buffer.reshape(-1, 8)[:, :3]
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        origins = rng.normal(size=(rays, 3))
+        origins = (low + high) / 2 + origins / np.linalg.norm(origins, axis=1)[:, None] * np.linalg.norm(high - low)
+        directions = low + rng.random((rays, 3)) * (high - low) - origins
+        directions /= np.linalg.norm(directions, axis=1)[:, None]
+        seconds, (_, triangle, _) = best_time(bvh.intersect, origins, directions, repeat=3)
+        print('%-20s %10d %10d %10.1f %12.0f %7.1f%%' % (os.path.basename(path), len(indices) // 3, len(bvh.child),
+                                                        build_time * 1000, rays / seconds,
+                                                        (triangle >= 0).mean() * 100))
+
+
+def tile_obj(src, dst, copies):
+    # writes copies of src side by side into dst, used to build large synthetic meshes
+    vertices, textures, normals, indices_data = ObjLoader.parse_obj(open(src, 'rb').read())
+    sizes = np.array([len(vertices), len(textures), len(normals)])
+    width = vertices[:, 0].max() - vertices[:, 0].min()
+    with open(dst, 'w') as f:
+        for i in range(copies):
+            np.savetxt(f, vertices + (i * width, 0, 0), fmt='v %.6f %.6f %.6f')
+            np.savetxt(f, textures, fmt='vt %.6f %.6f')
+            np.savetxt(f, normals, fmt='vn %.6f %.6f %.6f')
+            faces = (indices_data + 1 + i * sizes).reshape(-1, 9)
+            np.savetxt(f, faces, fmt='f %d/%d/%d %d/%d/%d %d/%d/%d')
+
+
+def bench_parallel(num_faces=1000000, worker_counts=(1, 2, 4, 8)):
+    # parallel parsing of chibi.obj tiled up to num_faces triangles
+    src = os.path.join(MESH_DIR, 'chibi.obj')
+    copies = -(-num_faces // (len(ObjLoader.parse_obj(open(src, 'rb').read())[3]) // 3))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'chibi_tiled.obj')
+        tile_obj(src, path, copies)
+        size = os.path.getsize(path)
+        print('%d copies, %.1f MB, %d cpus' % (copies, size / 1e6, os.cpu_count()))
+        print('%-8s %10s %10s %12s' % ('workers', 'seconds', 'MB/s', 'faces/s'))
+        for workers in worker_counts:
+            seconds, (indices, _) = best_time(ObjLoader.load_model, path, True, 1.0, workers, repeat=1)
+            print('%-8d %10.2f %10.1f %12.0f' % (workers, seconds, size / 1e6 / seconds, len(indices) / 3 / seconds))
+
+
+def write_grid(path, size, quads):
+    # writes a size x size grid of v/vt/vn quads, or the same grid split into triangles
+    y, x = np.mgrid[0:size + 1, 0:size + 1]
+    points = np.stack((x.ravel(), y.ravel(), np.zeros(x.size)), axis=1) / size
+    corner = (y[:-1, :-1] * (size + 1) + x[:-1, :-1]).ravel() + 1
+    quad = np.stack((corner, corner + 1, corner + size + 2, corner + size + 1), axis=1)
+    faces = quad if quads else quad[:, [0, 1, 2, 0, 2, 3]].reshape(-1, 3)
+    with open(path, 'w') as f:
+        np.savetxt(f, points, fmt='v %.6f %.6f %.6f')
+        np.savetxt(f, points[:, :2], fmt='vt %.6f %.6f')
+        f.write('vn 0 0 1\n')
+        corners = np.stack((faces, faces, np.ones_like(faces)), axis=2).reshape(len(faces), -1)
+        np.savetxt(f, corners, fmt='f' + ' %d/%d/%d' * faces.shape[1])
+
+
+def bench_quads(size=300):
+    # quads are triangulated inside the loader, they should parse about as fast as pre-split triangles
+    print('%-10s %10s %10s %12s' % ('faces', 'triangles', 'ms', 'triangles/s'))
+    with tempfile.TemporaryDirectory() as directory:
+        for quads in (False, True):
+            path = os.path.join(directory, 'grid.obj')
+            write_grid(path, size, quads)
+            seconds, (indices, _) = best_time(ObjLoader.load_model, path, repeat=3)
+            print('%-10s %10d %10.1f %12.0f' % ('quads' if quads else 'triangles', len(indices) // 3, seconds * 1000,
+                                                len(indices) / 3 / seconds))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='asset loading benchmarks')
+    parser.add_argument('--json', metavar='FILE', help='run the load suite only and write its results to FILE')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per case of the load suite, the best counts')
+    args = parser.parse_args()
+    if args.json:
+        results = run_suite(args.repeat)
+        print_suite(results)
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+        sys.exit()
+
+    # time the parser itself, not the mesh cache
+    ObjLoader.cache = None
+    print('sorted (glDrawArrays) against the reference parser')
+    bench_parser()
+    print('\npre-scan')
+    bench_scan()
+    print('\nindexed (glDrawElements) against sorted')
+    bench_indexed()
+    print('\ncompact vertex format')
+    bench_compact()
+    print('\nnormal generation')
+    bench_normals()
+    print('\nvertex cache optimization')
+    bench_vertex_cache()
+    print('\noverdraw optimization')
+    bench_overdraw()
+    print('\nLOD chain')
+    bench_lod()
+    print('\nmeshlets')
+    bench_meshlets()
+    print('\nBVH ray queries')
+    bench_bvh()
+    print('\nmesh deduplication')
+    bench_dedup()
+    print('\nbinary glTF')
+    bench_glb()
+    print('\nmesh cache')
+    bench_cache()
+    print('\ntexture cache')
+    bench_texture_cache()
+    print('\nmesh codec')
+    bench_codec()
+    print('\nquad triangulation')
+    bench_quads()
+    print('\nparallel parsing')
+    bench_parallel()
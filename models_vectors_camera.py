@@ -6,8 +6,7 @@ from OpenGL.GL import *
 from OpenGL.GL.shaders import compileProgram, compileShader
 from OpenGL.GLU import *
 import pyrr
-from TextureLoader import load_texture_pygame
-from ObjLoader import ObjLoader
+from AssetManager import AssetManager
 import numpy as np
 from ctypes import c_void_p
 
@@ -98,40 +97,17 @@ def mouse_look(xpos, ypos):
     cam.process_mouse_movement(xoffset, yoffset, constrain_pitch=False)
 
 shaders = {}    # Holds {'shader_name': {'shader_program': ..., 'model_loc': ..., 'proj_loc': ..., 'view_loc': ...}}
-all_objs = {}   # Holds {'obj_name': {'VAO': ..., 'VBO': ..., 'textures': ..., '': ..., 'num_faces': ...}}
+all_objs = {}   # Holds {'obj_name': {'mesh': future of AssetManager.load_mesh, 'texture': future of AssetManager.load_texture}}
 lines = []      # Holds line names which are keys for the all_objs dict
 objs = []       # Holds names of objs read in from .obj models
+assets = AssetManager(watch_interval=0.5)  # Decodes the objs and textures in worker threads, uploads them from the render loop, reloads edited files
 
-# Returns the object index
+# Returns the object index, the mesh and the texture load in the background and are drawn once both are uploaded
 def load_obj(obj_filepath, texture_filepath, scale=1.0):
     obj_name = 'obj'+str(len(objs)).zfill(5)
     objs.append(obj_name)
-    all_objs[obj_name] = {'VAO': glGenVertexArrays(1), 'VBO': glGenBuffers(1), 'textures': glGenTextures(1)}
-
-    obj_faces, obj_buffer = ObjLoader.load_model(obj_filepath, scale)
-
-    all_objs[obj_name]['num_faces'] = len(obj_faces)
-
-    # Vertex Array Object
-    glBindVertexArray(all_objs[obj_name]['VAO'])
-
-    # Vertex Buffer Object
-    glBindBuffer(GL_ARRAY_BUFFER, all_objs[obj_name]['VBO'])
-    glBufferData(GL_ARRAY_BUFFER, obj_buffer.nbytes, obj_buffer, GL_STATIC_DRAW)
-
-    # vertices
-    glEnableVertexAttribArray(0)
-    glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, obj_buffer.itemsize * 8, ctypes.c_void_p(0))
-    
-    # textures
-    glEnableVertexAttribArray(1)
-    glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, obj_buffer.itemsize * 8, ctypes.c_void_p(12))
-    load_texture_pygame(texture_filepath, all_objs[obj_name]['textures'])
-
-    # normals
-    glEnableVertexAttribArray(2)
-    glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, obj_buffer.itemsize * 8, ctypes.c_void_p(20))
-
+    # the mesh is welded, cache optimized and quantized to 16 byte vertices, see ObjLoader.load_compact
+    all_objs[obj_name] = {'mesh': assets.load_mesh(obj_filepath, scale=scale), 'texture': assets.load_texture(texture_filepath)}
     return obj_name
 
 def rot_matrix_x_44(degrees):
@@ -147,18 +123,24 @@ def rot_matrix_z_44(degrees):
     return np.array(((c, -s, 0, 0), (s, c, 0, 0), (0, 0, 1, 0), (0, 0, 0, 1)))
 
 def draw_obj(obj_name, xpos, ypos, zpos, roll, pitch, yaw):
+    # still streaming in
+    if not (all_objs[obj_name]['mesh'].done() and all_objs[obj_name]['texture'].done()):
+        return
+    mesh = all_objs[obj_name]['mesh'].result()
+
     #TODO We really should only change obj_pos upon updated pos or rotation
     translation_matrix = pyrr.matrix44.create_from_translation(pyrr.Vector3([xpos, ypos, zpos]))
     rot_x = rot_matrix_x_44(roll)
     rot_y = rot_matrix_y_44(pitch)
     rot_z = rot_matrix_z_44(yaw)
     pos_matrix = pyrr.matrix44.multiply(pyrr.matrix44.multiply(pyrr.matrix44.multiply(rot_x, rot_y), rot_z), translation_matrix)
+    pos_matrix = pyrr.matrix44.multiply(mesh['decode'], pos_matrix)
 
     # draw the obj
-    glBindVertexArray(all_objs[obj_name]['VAO'])
-    glBindTexture(GL_TEXTURE_2D, all_objs[obj_name]['textures'])
+    glBindVertexArray(mesh['VAO'])
+    glBindTexture(GL_TEXTURE_2D, all_objs[obj_name]['texture'].result())
     glUniformMatrix4fv(shaders['shader_obj']['model_loc'], 1, GL_FALSE, pos_matrix)
-    glDrawArrays(GL_TRIANGLES, 0, all_objs[obj_name]['num_faces'])
+    glDrawElements(GL_TRIANGLES, mesh['index_count'], mesh['index_type'], None)
 
 def rotate_obj(obj_index, pitch, roll, yaw):
     # Create rotation matrices from the euler angles
@@ -288,6 +270,10 @@ def main():
 
         ct = pygame.time.get_ticks() / 1000
 
+        # reload edited objs and textures in place, then upload what the workers finished, a few milliseconds per frame
+        assets.reload_changed()
+        assets.process_uploads()
+
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
 
         view = cam.get_view_matrix()
@@ -314,6 +300,7 @@ def main():
         pygame.display.flip()
         pygame.time.wait(1)
 
+    assets.shutdown(wait=False)
     pygame.quit()
 
 main()
\ No newline at end of file